@@ -37,7 +37,7 @@ class JWTBearer(HTTPBearer):
 
 async def authenticated_user(jwt: Annotated[JWTBearer(), Depends()]):
     user_id = utils.user_id_from_email(jwt.get("email", None))
-    local_user = user_db.get_by_id(user_id)
+    local_user = await user_db.get_by_id(user_id)
     if not local_user:
         raise HTTPException(401, "Invalid JWT")
     return m.RegisteredUser.model_validate(local_user)
@@ -52,7 +52,7 @@ async def any_type_of_user(
         return m.AnyUser.model_validate({"permission": [m.userPermisison.ops_admin]})
     if jwt:
         user_id = utils.user_id_from_email(jwt.get("email", None))
-        local_user = user_db.get_by_id(user_id)
+        local_user = await user_db.get_by_id(user_id)
         if local_user:
             return m.RegisteredUser.model_validate(local_user)
         else:
@@ -0,0 +1,76 @@
+"""Conditional GET support: ETag and Last-Modified validators, answering
+If-None-Match and If-Modified-Since with 304 Not Modified, and Cache-Control.
+
+Endpoints work out a validator from something much cheaper than the response
+itself (a version probe query, or an in-memory value) and call `not_modified`
+before doing the expensive work, returning its response if there is one."""
+import hashlib
+import json
+from datetime import date, datetime, time, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response
+
+from app import config
+
+
+def etag(*parts) -> str:
+    """A strong ETag for a response determined by the given JSON-able parts"""
+    data = json.dumps(parts, default=str, separators=(",", ":")).encode()
+    return '"' + hashlib.sha256(data).hexdigest()[:32] + '"'
+
+
+def request_etag(request: Request, *version) -> str:
+    """An ETag for a response determined by the request's path and query parameters
+    and a version of the data it reads"""
+    params = sorted(request.query_params.multi_items())
+    return etag(request.url.path, params, *version)
+
+
+def _as_datetime(value: date) -> datetime:
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, time())
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _fresh(request: Request, tag: str, last_modified: datetime | None) -> bool:
+    # If-None-Match takes precedence over If-Modified-Since (RFC 9110 13.2.2)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+        return "*" in tags or tag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified <= since
+    return False
+
+
+def not_modified(
+    request: Request,
+    response: Response,
+    route: str,
+    tag: str,
+    last_modified: date | None = None,
+) -> Response | None:
+    """Set the validators and the route's Cache-Control (from config.CACHE_CONTROL)
+    on the response. If the client's copy is still current, return a 304 response
+    for the endpoint to return instead."""
+    headers = {"ETag": tag}
+    if route in config.CACHE_CONTROL:
+        headers["Cache-Control"] = config.CACHE_CONTROL[route]
+    if last_modified is not None:
+        last_modified = _as_datetime(last_modified)
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+
+    if _fresh(request, tag, last_modified):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -1,5 +1,5 @@
 from dotenv import load_dotenv
-import os, sys
+import os, sys, tempfile
 from rdflib import Namespace
 
 load_dotenv()
@@ -18,7 +18,83 @@ JWKS_URL = os.environ.get("JWKS_URL", None)
 JWT_AUD = os.environ.get("JWT_AUD", None)
 OPS_API_KEY = os.environ.get("OPS_API_KEY", None)
 
+# Organisations come from the GOV.UK organisations API, via a snapshot saved at
+# ORGANISATIONS_SNAPSHOT that's refreshed in the background every
+# ORGANISATIONS_REFRESH seconds (see app/organisations.py). For tests,
+# ORGANISATIONS_FIXTURE is a snapshot file to use instead, without fetching.
+ORGANISATIONS_URL = os.environ.get(
+    "ORGANISATIONS_URL", "https://www.gov.uk/api/organisations"
+)
+ORGANISATIONS_SNAPSHOT = os.environ.get(
+    "ORGANISATIONS_SNAPSHOT",
+    os.path.join(tempfile.gettempdir(), "marketplace-organisations.json"),
+)
+ORGANISATIONS_REFRESH = float(os.environ.get("ORGANISATIONS_REFRESH", 86400))
+ORGANISATIONS_FETCH_TIMEOUT = float(os.environ.get("ORGANISATIONS_FETCH_TIMEOUT", 10))
+ORGANISATIONS_FIXTURE = os.environ.get("ORGANISATIONS_FIXTURE", None)
+
 cddo_graph = Namespace("http://marketplace.cddo.gov.uk/graph/")
 ASSET_GRAPH = cddo_graph.assets
 USER_GRAPH = cddo_graph.users
 SHARE_GRAPH = cddo_graph.shares
+
+# Connection pool for the triplestore. Timeouts are in seconds.
+SPARQL_POOL_SIZE = int(os.environ.get("SPARQL_POOL_SIZE", 10))
+SPARQL_CONNECT_TIMEOUT = float(os.environ.get("SPARQL_CONNECT_TIMEOUT", 5))
+SPARQL_READ_TIMEOUT = float(os.environ.get("SPARQL_READ_TIMEOUT", 30))
+
+# Number of slowest SPARQL queries to keep, and over how many seconds, for /metrics/slow-queries
+SLOW_QUERY_LOG_SIZE = int(os.environ.get("SLOW_QUERY_LOG_SIZE", 20))
+SLOW_QUERY_WINDOW = float(os.environ.get("SLOW_QUERY_WINDOW", 3600))
+
+# In-process cache of SPARQL query results. Set SPARQL_CACHE_TTL to 0 to turn it off.
+# Results with more than SPARQL_CACHE_MAX_ROWS rows are not cached.
+SPARQL_CACHE_SIZE = int(os.environ.get("SPARQL_CACHE_SIZE", 1000))
+SPARQL_CACHE_TTL = float(os.environ.get("SPARQL_CACHE_TTL", 60))
+SPARQL_CACHE_MAX_ROWS = int(os.environ.get("SPARQL_CACHE_MAX_ROWS", 5000))
+
+# In-process search index for /catalogue, built at startup and rebuilt every
+# SEARCH_INDEX_REFRESH seconds (0 to only build it once). Searches go to the
+# triplestore while it is being built.
+SEARCH_INDEX = os.environ.get("SEARCH_INDEX", "false").lower() in ("1", "true", "yes")
+SEARCH_INDEX_REFRESH = float(os.environ.get("SEARCH_INDEX_REFRESH", 600))
+
+# Prefix index for /catalogue/suggest, rebuilt after every publish and every
+# SUGGEST_REFRESH seconds (0 to only rebuild after publishing)
+SUGGEST_REFRESH = float(os.environ.get("SUGGEST_REFRESH", 600))
+
+# Vocabularies used to validate published assets (media types, update frequencies,
+# themes) are loaded into memory at startup and reloaded in the background every
+# this many seconds (0 to only load them once)
+REFERENCE_DATA_REFRESH = float(os.environ.get("REFERENCE_DATA_REFRESH", 600))
+
+# Serve asset details and search results from documents rendered when each asset
+# is published (see app/db/read_model.py). Run `python -m app.rebuild_read_model`
+# after turning it on, and after upgrades that change the documents.
+READ_MODEL = os.environ.get("READ_MODEL", "false").lower() in ("1", "true", "yes")
+
+# The most follow-up queries (distribution details in chunks, linked assets) one
+# asset detail request runs at once, so that a single request can't take every
+# connection in the pool
+DETAIL_QUERY_CONCURRENCY = int(os.environ.get("DETAIL_QUERY_CONCURRENCY", 4))
+
+# Fetch asset details with one CONSTRUCT query, framed into the response in Python,
+# rather than a SELECT for the asset, then its distributions, then its links
+ASSET_DETAIL_CONSTRUCT = os.environ.get("ASSET_DETAIL_CONSTRUCT", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+# Cache-Control headers for responses that support conditional requests (ETag and
+# If-None-Match). Each can be overridden with CACHE_CONTROL_<NAME>, e.g.
+# CACHE_CONTROL_ASSET="public, max-age=300"
+CACHE_CONTROL = {
+    name: os.environ.get(f"CACHE_CONTROL_{name.upper()}", default)
+    for name, default in {
+        "catalogue": "no-cache",
+        "asset": "no-cache",
+        "organisations": "public, max-age=3600",
+        "vocabularies": "public, max-age=600",
+    }.items()
+}
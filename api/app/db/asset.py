@@ -1,94 +1,413 @@
+import asyncio
+from datetime import date
 from typing import List
 from app.db.sparql import assets_db
 from app.db import utils as dbutils
 from app import utils
 from app import model as m
+from app.db.model import type_uri
+from app.db.search_index import search_index, tokenise, FIELD_BOOSTS
+from app import config
+from app.db.frame import frame_detail
+from app.db import read_model
+from app.db.cursor import InvalidCursor, encode_cursor, decode_cursor, literal
+from rdflib import Literal
+from rdflib.namespace import XSD
+
+assets_db.require(
+    {
+        "asset_search": ["q", "filters", "limit", "offset", "after"],
+        "asset_search_count": ["q", "filters"],
+        "asset_facet_topics": ["q", "filters"],
+        "asset_facet_organisations": ["q", "filters"],
+        "asset_facet_types": ["q", "filters"],
+        "asset_summary": ["resources"],
+        "asset_summary_media_types": ["resources"],
+        "asset_summary_creators": ["resources"],
+        "asset_summary_themes": ["resources"],
+        "distribution_detail": ["distribution"],
+        "asset_detail": ["asset_id"],
+        "asset_detail_bulk": ["values"],
+        "asset_detail_graph": ["asset_id"],
+        "asset_hrefs": ["resources"],
+        "export_asset_ids": ["filters", "limit"],
+        "asset_counts_by_org": ["org"],
+        "asset_version": ["asset_id"],
+        "linking_assets": ["resources"],
+        "catalogue_version": [],
+        "search_index_assets": [],
+        "search_index_text": ["resources"],
+    }
+)
+
+
+def _resolve_media_type_labels(db_result_dicts):
+    for r in db_result_dicts:
+        if "mediaTypeLabel" in r:
+            r["mediaType"] = r.pop("mediaTypeLabel")
+        yield r
+
+
+def _values_block(variable: str, terms: List[str]):
+    return f"VALUES {variable} {{ {' '.join(terms)} }}"
+
+
+def _construct_filter(
+    organisations: List[str], themes: List[str], asset_types: List[m.assetType]
+):
+    """Restricts a search to the given organisations, themes and asset types.
+    Values for the same filter are ORed, different filters are ANDed. Rather than a
+    FILTER, which is applied to every row after the join, each filter binds its
+    variable with a VALUES block so that the triplestore only joins matching rows."""
+    clauses = []
+    if organisations:
+        orgs = [Literal(o).n3() for o in organisations]
+        clauses.append(_values_block("?organisation", orgs))
+    if themes:
+        clauses.append("?resourceUri dcat:theme ?filterThemeURI .")
+        clauses.append("?filterThemeURI skos:prefLabel ?filterTheme .")
+        labels = [Literal(t, lang="en").n3() for t in themes]
+        clauses.append(_values_block("?filterTheme", labels))
+    if asset_types:
+        types = [type_uri(t).n3() for t in asset_types]
+        clauses.append(_values_block("?typeURI", types))
+    return "\n    ".join(clauses)
+
+
+def _summaries_by_uri(query_results):
+    results = dbutils.aggregate_query_results_by_key(query_results, "resourceUri")
+    return {r["resourceUri"]: r for r in results}
+
+
+def _collect_values(field):
+    """Returns a pipeline that collects the values of `field` for each resource"""
+
+    def collect(query_results):
+        values = {}
+        for r in query_results:
+            values.setdefault(r["resourceUri"], set()).add(r[field])
+        return values
+
+    return collect
 
 
-def _resolve_media_type_label(db_result_dict):
-    if "mediaTypeLabel" in db_result_dict:
-        db_result_dict["mediaType"] = db_result_dict["mediaTypeLabel"]
-        db_result_dict.pop("mediaTypeLabel")
+def _collect_media_types(query_results):
+    return _collect_values("mediaType")(_resolve_media_type_labels(query_results))
 
 
-def _construct_OR_terms(property: str, vals: List[str]):
-    if len(vals) == 0:
-        return None
-    terms = " || ".join([f'STR({property}) = "{v}"' for v in vals])
-    return f"({terms})"
+async def _asset_summaries(resource_uris: List[str]):
+    """Fetch the summaries of the given assets, in the same order. With the read
+    model on, they're its summary documents where there are current ones."""
+    if not config.READ_MODEL:
+        return await _summaries_from_triples(resource_uris)
+    summaries = await read_model.summaries(resource_uris)
+    missing = [uri for uri in resource_uris if uri not in summaries]
+    for summary in await _summaries_from_triples(missing):
+        summaries[summary["resourceUri"]] = summary
+    return [summaries[uri] for uri in resource_uris if uri in summaries]
 
 
-def _construct_AND_terms(terms: List[str]):
-    terms = [t for t in terms if t]  # Remove Nones
-    terms = " && ".join(terms)
-    return f"({terms})"
+async def _summaries_from_triples(resource_uris: List[str]):
+    """Each multi-valued field is fetched by its own query so that the rows returned
+    are the sum of the values rather than their product"""
+    if not resource_uris:
+        return []
+    resources = [f"<{uri}>" for uri in resource_uris]
+    summaries, media_types, creators, themes = await asyncio.gather(
+        assets_db.stream_query("asset_summary", _summaries_by_uri, resources=resources),
+        assets_db.stream_query(
+            "asset_summary_media_types", _collect_media_types, resources=resources
+        ),
+        assets_db.stream_query(
+            "asset_summary_creators", _collect_values("creator"), resources=resources
+        ),
+        assets_db.stream_query(
+            "asset_summary_themes", _collect_values("theme"), resources=resources
+        ),
+    )
+    assets = []
+    for uri in resource_uris:
+        if uri not in summaries:
+            continue
+        asset = summaries[uri]
+        for field, values in [
+            ("mediaType", media_types),
+            ("creator", creators),
+            ("theme", themes),
+        ]:
+            if uri in values:
+                asset[field] = values[uri]
+        assets.append(asset)
+    assets = dbutils.enrich_query_results(assets)
+    return list(dbutils.munge_asset_summary_responses(assets))
+
+
+def _text_query(q: str):
+    """A Lucene query for the words of `q` in any field of the text index, with the
+    last word matched as a prefix. Only the words are kept, so the user can't write
+    Lucene query syntax (or break out of the SPARQL string)."""
+    words = tokenise(q)
+    if not words:
+        return "*"
+    terms = " ".join(words[:-1] + [f"{words[-1]}*"])
+    return " ".join(f"{f}:({terms})^{boost}" for f, boost in FIELD_BOOSTS.items())
+
+
+def _search_bindings(
+    q: str,
+    organisations: List[str],
+    themes: List[str],
+    asset_types: List[m.assetType],
+):
+    """The text query and filters for a search, normalised so that equivalent searches
+    produce identical queries and so share cached results"""
+    filters = _construct_filter(
+        sorted(set(organisations)),
+        sorted(set(themes)),
+        sorted(set(m.assetType(t) for t in asset_types)),
+    )
+    return {"q": _text_query(q), "filters": filters}
+
+
+def _search_after(cursor: str, ranked: bool):
+    """The HAVING clause for a page of asset_search after the cursor"""
+    _, relevance, sort_key, uri = decode_cursor(
+        cursor, ["store"], [(str, type(None)), (str,), (str,)]
+    )
+    if (relevance is not None) != ranked:
+        raise InvalidCursor("Cursor is for a different search")
+    title = "MIN(LCASE(?title))"
+    after = (
+        f"{title} > {literal(sort_key)} || ({title} = {literal(sort_key)} "
+        f"&& STR(?resourceUri) > {literal(uri)})"
+    )
+    if ranked:
+        try:
+            score = Literal(str(float(relevance)), datatype=XSD.float).n3()
+        except ValueError:
+            raise InvalidCursor("Invalid cursor")
+        after = f"MAX(?score) < {score} || (MAX(?score) = {score} && ({after}))"
+    return f"HAVING ({after})"
+
+
+async def _search_store(q, organisations, themes, asset_types, limit, offset, cursor):
+    bindings = _search_bindings(q, organisations, themes, asset_types)
+    ranked = bool(tokenise(q))
+    after = _search_after(cursor, ranked) if cursor else ""
+    page, count = await asyncio.gather(
+        assets_db.run_query(
+            "asset_search",
+            limit=int(limit),
+            offset=int(offset),
+            after=after,
+            **bindings,
+        ),
+        assets_db.run_query("asset_search_count", **bindings),
+    )
+    assets = await _asset_summaries([r["resourceUri"] for r in page])
+    if ranked:
+        relevance = {r["resourceUri"]: float(r["relevance"]) for r in page}
+        for a in assets:
+            a["relevance"] = relevance[a["resourceUri"]]
+    next_cursor = None
+    if page and len(page) == limit:
+        last = page[-1]
+        relevance = last["relevance"] if ranked else None
+        next_cursor = encode_cursor(
+            "store", relevance, last["sortKey"], last["resourceUri"]
+        )
+    return assets, int(count[0]["total"]), next_cursor
 
 
-def _construct_filter(*filter_groups):
-    """A filter_group is a set of filters to apply to a particular property.
-    It has this shape: ["?theme", ["Mapping", "Defence"]]
-    We need to use an OR for values in the same filter group and
-    an AND between different filter groups."""
-    if len(filter_groups) == 0:
-        return ""
-    if all(len(v) == 0 for _, v in filter_groups):
-        return ""
-    or_terms = [_construct_OR_terms(p, v) for p, v in filter_groups]
-    anded_terms = _construct_AND_terms(or_terms)
-    return f"FILTER ({anded_terms})"
+def _search_index(q, organisations, themes, asset_types, limit, offset, cursor):
+    after = None
+    if cursor:
+        _, relevance, sort_key, uri = decode_cursor(
+            cursor, ["index"], [(float, int, type(None)), (str,), (str,)]
+        )
+        after = (relevance, sort_key, uri)
+    filters = _index_filters(organisations, themes, asset_types)
+    assets, total = search_index.search(q, filters, int(limit), int(offset), after)
+    next_cursor = None
+    if assets and len(assets) == limit:
+        last = assets[-1]
+        next_cursor = encode_cursor(
+            "index",
+            last.get("relevance"),
+            last["title"].lower(),
+            last["resourceUri"],
+        )
+    return assets, total, next_cursor
 
 
-def search(q: str = "", organisations: List[str] = [], themes: List[str] = []):
-    if q == "":
-        q = "*"
-    else:
-        q = f"{q}*"
+async def search(
+    q: str = "",
+    organisations: List[str] = [],
+    themes: List[str] = [],
+    asset_types: List[m.assetType] = [],
+    limit: int = 100,
+    offset: int = 0,
+    cursor: str = None,
+):
+    """Returns one page of matching asset summaries, most relevant first and then by
+    title, along with the total number of matching assets and a cursor for the next
+    page (None on the last page). The page starts after `cursor` if one is given.
 
-    # TODO What else do we need to do to sanitise the query string?
-    q = utils.sanitise_search_query(q)
+    Cursors record whether they came from the search index or the triplestore, as
+    their relevance scores differ. A cursor from the triplestore carries on there
+    even once the index is ready; one from the index can't be used while it's cold
+    (e.g. on an API worker that has just started)."""
+    args = (q, organisations, themes, asset_types, limit, offset, cursor)
+    kind = None
+    if cursor:
+        kind = decode_cursor(cursor, ["index", "store"], [object] * 3)[0]
+    if kind == "store":
+        return await _search_store(*args)
+    if search_index.ready:
+        return _search_index(*args)
+    if kind == "index":
+        raise InvalidCursor("Cursor has expired, start the search again")
+    return await _search_store(*args)
 
-    filters = _construct_filter(["?organisation", organisations], ["?theme", themes])
 
-    query_results = assets_db.run_query("asset_search", q=q, filters=filters)
+def _index_filters(organisations, themes, asset_types):
+    return {
+        "organisation": organisations,
+        "theme": themes,
+        "type": [m.assetType(t).value for t in asset_types],
+    }
+
+
+def _organisation_title(slug):
+    try:
+        return utils.lookup_organisation(slug).title
+    except ValueError:
+        return slug
+
+
+def _facet_counts(title_fn=lambda v: v):
+    """Returns a pipeline turning facet count results into SearchFacets,
+    most common first"""
+
+    def to_facets(query_results):
+        facets = [
+            {"id": r["facet"], "title": title_fn(r["facet"]), "count": int(r["count"])}
+            for r in query_results
+        ]
+        return sorted(facets, key=lambda f: (-f["count"], f["title"]))
+
+    return to_facets
+
+
+async def facets(
+    q: str = "",
+    organisations: List[str] = [],
+    themes: List[str] = [],
+    asset_types: List[m.assetType] = [],
+) -> dict:
+    """Counts of the assets matching a search for each topic, organisation and asset type"""
+    if search_index.ready:
+        filters = _index_filters(organisations, themes, asset_types)
+        counts = search_index.facet_counts(q, filters)
+        return {
+            "topics": _facet_counts()(counts["theme"]),
+            "organisations": _facet_counts(_organisation_title)(counts["organisation"]),
+            "assetTypes": _facet_counts()(counts["type"]),
+        }
+    bindings = _search_bindings(q, organisations, themes, asset_types)
+    topics, orgs, asset_types = await asyncio.gather(
+        assets_db.stream_query("asset_facet_topics", _facet_counts(), **bindings),
+        assets_db.stream_query(
+            "asset_facet_organisations",
+            _facet_counts(_organisation_title),
+            **bindings,
+        ),
+        assets_db.stream_query("asset_facet_types", _facet_counts(), **bindings),
+    )
+    return {"topics": topics, "organisations": orgs, "assetTypes": asset_types}
+
+
+def _collect_texts(query_results):
+    texts = {}
     for r in query_results:
-        _resolve_media_type_label(r)
-    result_dicts = dbutils.aggregate_query_results_by_key(
-        query_results, group_key="resourceUri"
+        texts.setdefault(r["resourceUri"], []).append((r["field"], r["text"]))
+    return texts
+
+
+async def _search_index_entries(resource_uris: List[str]):
+    """The summary record and searchable text of each of the given assets. The
+    records come from the triples even with the read model on: the index needs
+    their dates and organisations as values, not as the summary documents' JSON."""
+    summaries, texts = await asyncio.gather(
+        _summaries_from_triples(resource_uris),
+        assets_db.stream_query(
+            "search_index_text",
+            _collect_texts,
+            resources=[f"<{uri}>" for uri in resource_uris],
+        ),
     )
-    result_dicts = [dbutils.enrich_query_result_dict(r) for r in result_dicts]
-    result_dicts = [dbutils.munge_asset_summary_response(r) for r in result_dicts]
+    return [(s, texts.get(s["resourceUri"], [])) for s in summaries]
+
 
-    return result_dicts
+async def build_search_index(chunk_size: int = 500):
+    """Load every asset in the catalogue into the search index"""
+    search_index.begin_load()
+    try:
+        uris = await assets_db.run_query("search_index_assets")
+        uris = [r["resourceUri"] for r in uris]
+        entries = []
+        for i in range(0, len(uris), chunk_size):
+            entries += await _search_index_entries(uris[i : i + chunk_size])
+    except BaseException:
+        search_index.abort_load()
+        raise
+    search_index.load(entries)
 
 
-def _get_asset_id_if_exists(uri) -> str | m.AssetForHref:
-    result = assets_db.run_query("asset_id_title", asset=f"<{uri}>")
-    assert len(result) <= 1
-    if not result:
-        return uri
-    asset = result[0]
-    return {"identifier": asset["id"], "title": asset["title"]}
+async def index_assets(resource_uris: List[str]):
+    """Add newly published assets to the search index"""
+    if config.SEARCH_INDEX and resource_uris:
+        search_index.add(await _search_index_entries(resource_uris))
 
 
-def _fetch_distribution_details(distribution_ids):
+async def maintain_search_index():
+    """Build the search index, then rebuild it every SEARCH_INDEX_REFRESH seconds
+    to pick up assets published through other API workers"""
+    while True:
+        try:
+            await build_search_index()
+        except Exception as e:
+            print(f"Failed to build the search index: {e}")
+        if config.SEARCH_INDEX_REFRESH <= 0 and search_index.ready:
+            return
+        await asyncio.sleep(config.SEARCH_INDEX_REFRESH or 60)
+
+
+def _distributions(query_results):
+    results = _resolve_media_type_labels(query_results)
+    return list(
+        dbutils.aggregate_query_results_by_key(results, group_key="distribution")
+    )
+
+
+async def _fetch_distribution_details(distribution_ids, cache=True):
     distribution_ids = [f"<{i}>" for i in distribution_ids]
-    results = assets_db.run_query("distribution_detail", distribution=distribution_ids)
-    for r in results:
-        _resolve_media_type_label(r)
-    return dbutils.aggregate_query_results_by_key(results, group_key="distribution")
+    return await assets_db.stream_query(
+        "distribution_detail", _distributions, cache, distribution=distribution_ids
+    )
 
 
-def detail(asset_id: str):
-    query_results = assets_db.run_query("asset_detail", asset_id=asset_id)
-    asset_result_dicts = dbutils.aggregate_query_results_by_key(
+def _asset_details(query_results):
+    results = dbutils.aggregate_query_results_by_key(
         query_results, group_key="resourceUri"
     )
-    result_dicts = [dbutils.enrich_query_result_dict(r) for r in asset_result_dicts]
-    assert len(result_dicts) == 1
-    asset = result_dicts[0]
+    return list(dbutils.enrich_query_results(results))
 
-    asset["identifier"] = asset_id
 
+def _complete_detail(asset: dict, distributions: dict, hrefs: dict):
+    """Fill in an asset's contact point, its distributions (from their details, by
+    URI) and its links to other assets (from their identifiers and titles, by URI;
+    links to assets that aren't in the catalogue stay as URIs)"""
     contactPoint = {
         "name": asset["contactName"],
         "email": asset["contactEmail"],
@@ -99,31 +418,227 @@ def detail(asset_id: str):
     asset["contactPoint"] = m.ContactPoint.model_validate(contactPoint)
 
     if asset["type"] == m.assetType.dataset:
-        distributions = _fetch_distribution_details(asset.get("distribution", []))
         asset["distributions"] = [
-            m.DistributionResponse.model_validate(d) for d in distributions
+            m.DistributionResponse.model_validate(distributions[d])
+            for d in asset.get("distribution", [])
+            if d in distributions
         ]
-
-        relatedAssets = [
-            _get_asset_id_if_exists(r) for r in asset.get("relatedAssets", [])
+        asset["relatedAssets"] = [
+            hrefs.get(r, r) for r in asset.get("relatedAssets", [])
         ]
-        asset["relatedAssets"] = relatedAssets
 
     if asset["type"] == m.assetType.service:
-        relatedAssets = [
-            _get_asset_id_if_exists(r) for r in asset.get("relatedAssets", [])
+        asset["relatedAssets"] = [
+            hrefs.get(r, r) for r in asset.get("relatedAssets", [])
         ]
-        asset["relatedAssets"] = relatedAssets
-
-        servesDataset = [
-            _get_asset_id_if_exists(r) for r in asset.get("servesDataset", [])
+        asset["servesDataset"] = [
+            hrefs.get(r, r) for r in asset.get("servesDataset", [])
         ]
-        asset["servesDataset"] = servesDataset
 
     asset["description"] = dbutils.unwrap_markdown(asset["description"])
     return asset
 
 
-def counts_by_org(org: str):
-    query_results = assets_db.run_query("asset_counts_by_org", org=org)
+def _linked_assets(asset: dict):
+    linked = asset.get("relatedAssets", [])
+    if asset["type"] == m.assetType.service:
+        linked = linked + asset.get("servesDataset", [])
+    return linked
+
+
+def _dataset_distributions(assets):
+    return [
+        d
+        for a in assets
+        if a["type"] == m.assetType.dataset
+        for d in a.get("distribution", [])
+    ]
+
+
+def _asset_hrefs(query_results):
+    return {
+        r["resourceUri"]: {"identifier": r["id"], "title": r["title"]}
+        for r in query_results
+    }
+
+
+async def _distributions_by_uri(distribution_ids, cache=True):
+    if not distribution_ids:
+        return {}
+    results = await _fetch_distribution_details(distribution_ids, cache)
+    return {d["distribution"]: d for d in results}
+
+
+async def _hrefs_by_uri(uris, cache=True):
+    """Links to those of the URIs that are assets in the catalogue, in one query.
+    Others are left out, so callers fall back to the URI itself."""
+    if not uris:
+        return {}
+    resources = [f"<{uri}>" for uri in sorted(uris)]
+    return await assets_db.stream_query(
+        "asset_hrefs", _asset_hrefs, cache, resources=resources
+    )
+
+
+# Distributions are looked up this many at a time, so that a dataset with many of
+# them is fetched by several smaller queries in parallel
+DISTRIBUTION_CHUNK = 20
+
+
+async def _linked_details(assets: List[dict], cache=True):
+    """The details of the assets' distributions, and links to the assets they link
+    to, both by URI. The lookups run concurrently, at most
+    config.DETAIL_QUERY_CONCURRENCY at a time."""
+    semaphore = asyncio.Semaphore(config.DETAIL_QUERY_CONCURRENCY)
+
+    async def limited(coro):
+        async with semaphore:
+            return await coro
+
+    distribution_ids = _dataset_distributions(assets)
+    chunks = [
+        distribution_ids[i : i + DISTRIBUTION_CHUNK]
+        for i in range(0, len(distribution_ids), DISTRIBUTION_CHUNK)
+    ]
+    hrefs, *distribution_chunks = await asyncio.gather(
+        limited(
+            _hrefs_by_uri({uri for a in assets for uri in _linked_assets(a)}, cache)
+        ),
+        *[limited(_distributions_by_uri(c, cache)) for c in chunks],
+    )
+    distributions = {}
+    for chunk in distribution_chunks:
+        distributions.update(chunk)
+    return distributions, hrefs
+
+
+async def _detail_from_graph(asset_id: str):
+    graph = await assets_db.construct("asset_detail_graph", asset_id=asset_id)
+    framed = frame_detail(graph, asset_id)
+    assert framed is not None
+    asset, distributions, hrefs = framed
+    asset["identifier"] = asset_id
+    return _complete_detail(asset, distributions, hrefs)
+
+
+async def detail(asset_id: str):
+    if config.ASSET_DETAIL_CONSTRUCT:
+        return await _detail_from_graph(str(asset_id))
+
+    result_dicts = await assets_db.stream_query(
+        "asset_detail", _asset_details, asset_id=asset_id
+    )
+    assert len(result_dicts) == 1
+    asset = result_dicts[0]
+
+    asset["identifier"] = asset_id
+
+    distributions, hrefs = await _linked_details([asset])
+
+    return _complete_detail(asset, distributions, hrefs)
+
+
+async def _bulk_details(values: str, cache=True) -> List[dict]:
+    """The full details of the assets selected by a VALUES block on ?resourceUri or
+    ?identifier, as detail() gives them, with one query for the assets and then
+    concurrent ones for their distributions and the assets they link to. With
+    `cache` False the queries bypass the query cache."""
+    assets = await assets_db.stream_query(
+        "asset_detail_bulk", _asset_details, cache, values=values
+    )
+    distributions, hrefs = await _linked_details(assets, cache)
+    return [_complete_detail(a, distributions, hrefs) for a in assets]
+
+
+async def details(asset_ids: List[str]) -> dict:
+    """The full details of each of the given assets that exists, by identifier"""
+    if not asset_ids:
+        return {}
+    identifiers = [Literal(str(i)).n3() for i in dict.fromkeys(asset_ids)]
+    assets = await _bulk_details(_values_block("?identifier", identifiers))
+    return {a["identifier"]: a for a in assets}
+
+
+async def export_details(modified_since: date = None, chunk_size: int = 100):
+    """Yields the full details of every asset (modified on or after `modified_since`,
+    if given), as detail() returns them, in order of resource URI.
+
+    Assets are fetched a chunk at a time, each chunk starting after the last asset
+    of the one before, with one query for the chunk's asset details and then
+    concurrent ones for their distributions and the assets they link to. So memory
+    use depends on the chunk size rather than the size of the catalogue. The
+    queries bypass the query cache, which a pass over every asset would only fill
+    with results that won't be asked for again."""
+    filters = []
+    if modified_since:
+        since = Literal(modified_since.isoformat(), datatype=XSD.date).n3()
+        filters.append(f"FILTER(?catalogueModified >= {since})")
+    after = None
+    while True:
+        page_filters = list(filters)
+        if after:
+            page_filters.append(f"FILTER(STR(?resourceUri) > {literal(after)})")
+        page = await assets_db.run_query(
+            "export_asset_ids",
+            cache=False,
+            filters="\n    ".join(page_filters),
+            limit=chunk_size,
+        )
+        if not page:
+            return
+        resources = [f"<{r['resourceUri']}>" for r in page]
+        values = _values_block("?resourceUri", resources)
+        for asset in await _bulk_details(values, cache=False):
+            yield asset
+
+        if len(page) < chunk_size:
+            return
+        after = page[-1]["resourceUri"]
+
+
+async def store_documents(resource_uris: List[str]) -> int:
+    """Store the read model documents of the given assets once they're published,
+    and re-store those of the assets that link to them, whose details now give
+    those links with their titles"""
+    resources = [f"<{uri}>" for uri in resource_uris]
+    linking = await assets_db.run_query("linking_assets", resources=resources)
+    resources += [f"<{r['resourceUri']}>" for r in linking]
+    details = await _bulk_details(_values_block("?resourceUri", sorted(set(resources))))
+    return await read_model.store(details)
+
+
+async def rebuild_documents(chunk_size: int = 100) -> int:
+    """Regenerate the read model documents of every asset, a chunk at a time.
+    Returns how many were stored."""
+    stored = 0
+    chunk = []
+    async for detail in export_details(chunk_size=chunk_size):
+        chunk.append(detail)
+        if len(chunk) == chunk_size:
+            stored += await read_model.store(chunk)
+            chunk = []
+    if chunk:
+        stored += await read_model.store(chunk)
+    return stored
+
+
+async def catalogue_version() -> tuple:
+    """Identifies the catalogue's current contents, for conditional requests: where
+    searches are answered from, the number of assets and the latest date one changed"""
+    if search_index.ready:
+        return ("index", *search_index.version())
+    results = await assets_db.run_query("catalogue_version")
+    version = results[0] if results else {}
+    return ("store", version.get("assets", "0"), version.get("modified"))
+
+
+async def asset_version(asset_id: str) -> dict | None:
+    """The asset's catalogueModified and the number of assets it links to that are
+    in the catalogue, or None if there's no such asset. Much cheaper than detail()."""
+    results = await assets_db.run_query("asset_version", asset_id=asset_id)
+    return results[0] if results else None
+
+
+async def counts_by_org(org: str):
+    query_results = await assets_db.run_query("asset_counts_by_org", org=org)
     return query_results
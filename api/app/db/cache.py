@@ -0,0 +1,155 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Iterable, Mapping
+
+from app import config, metrics
+
+cache_hits = metrics.Counter(
+    "sparql_cache_hits_total", "SPARQL queries answered from the cache", ("query",)
+)
+cache_misses = metrics.Counter(
+    "sparql_cache_misses_total", "SPARQL queries not found in the cache", ("query",)
+)
+cache_evictions = metrics.Counter(
+    "sparql_cache_evictions_total",
+    "Cache entries dropped to stay within the size limit",
+)
+cache_invalidations = metrics.Counter(
+    "sparql_cache_invalidations_total",
+    "Cache entries dropped because an update touched their graph",
+    ("graph",),
+)
+metrics.registry.extend(
+    [cache_hits, cache_misses, cache_evictions, cache_invalidations]
+)
+
+
+class QueryCache:
+    """LRU cache of raw query results, keyed by query and bindings, with a TTL.
+
+    Each entry is tagged with the named graphs its query reads; an update to any of
+    those graphs drops the entry. Each graph also has a generation number that is
+    bumped by every update, so a query that was already running when an update
+    happened doesn't put its (possibly stale) results into the cache."""
+
+    def __init__(self, size: int, ttl: float, max_rows: int):
+        self.size = size
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.size > 0 and self.ttl > 0
+
+    @staticmethod
+    def key(query_label: str, bindings: Mapping) -> tuple:
+        return (query_label, tuple(sorted(bindings.items())))
+
+    def get(self, key, query_label):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                cache_hits.inc(query=query_label)
+                return entry[2]
+            if entry is not None:
+                del self._entries[key]
+        cache_misses.inc(query=query_label)
+        return None
+
+    def generation(self, graphs: Iterable[str]) -> tuple:
+        with self._lock:
+            return tuple(self._generations.get(g, 0) for g in sorted(graphs))
+
+    def put(self, key, graphs: Iterable[str], results: list, generation: tuple):
+        if len(results) > self.max_rows:
+            return
+        with self._lock:
+            current = tuple(self._generations.get(g, 0) for g in sorted(graphs))
+            if current != generation:
+                return
+            self._entries[key] = (
+                time.monotonic() + self.ttl,
+                frozenset(graphs),
+                results,
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+                cache_evictions.inc()
+
+    def invalidate(self, graphs: Iterable[str]):
+        graphs = set(graphs)
+        with self._lock:
+            for g in graphs:
+                self._generations[g] = self._generations.get(g, 0) + 1
+            stale = [k for k, e in self._entries.items() if e[1] & graphs]
+            for k in stale:
+                for g in self._entries[k][1] & graphs:
+                    cache_invalidations.inc(graph=g)
+                del self._entries[k]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+query_cache = QueryCache(
+    size=config.SPARQL_CACHE_SIZE,
+    ttl=config.SPARQL_CACHE_TTL,
+    max_rows=config.SPARQL_CACHE_MAX_ROWS,
+)
+
+
+class InFlightQueries:
+    """Tracks queries that are currently running so that identical queries started
+    meanwhile can wait for the same results instead of hitting the triplestore again.
+
+    The first caller for a key (the leader) runs the query and finishes the call with
+    its raw results, or with None if they were too large to share or the leader
+    stopped reading early - followers then run the query themselves. Updates forget
+    the running calls that read the graphs they touched, so nobody joins a query
+    that may have read data from before the update."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def join(self, key, graphs: Iterable[str]) -> tuple[Future, bool]:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                return call[0], False
+            future = Future()
+            self._calls[key] = (future, frozenset(graphs))
+            return future, True
+
+    def get(self, key) -> Future | None:
+        with self._lock:
+            call = self._calls.get(key)
+        return call[0] if call else None
+
+    def finish(self, key, future: Future, results=None, error=None):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None and call[0] is future:
+                del self._calls[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(results)
+
+    def forget(self, graphs: Iterable[str]):
+        graphs = set(graphs)
+        with self._lock:
+            for k in [k for k, call in self._calls.items() if call[1] & graphs]:
+                del self._calls[k]
+
+
+in_flight_queries = InFlightQueries()
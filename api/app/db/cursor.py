@@ -0,0 +1,43 @@
+"""Opaque cursors for keyset pagination.
+
+A cursor holds the sort key of the last item on a page, and the next page is the
+items that sort after it. Everything needed to carry on is in the cursor itself, so
+it works on any API worker and after a restart, and items added meanwhile don't
+shift the pages. Cursors aren't signed: they can only choose where a list starts,
+and their values are written into queries as escaped literals."""
+import base64
+import binascii
+import json
+from typing import Any, List
+
+from rdflib import Literal
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(kind: str, *values: Any) -> str:
+    data = json.dumps([kind, *values], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode_cursor(token: str, kinds: List[str], types: List[tuple]) -> tuple:
+    """The kind and values of a cursor made by encode_cursor, checking that it's one
+    of the expected `kinds` and that each value has one of the given types"""
+    try:
+        data = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        kind, *values = json.loads(data)
+    except (binascii.Error, ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+    if kind not in kinds or len(values) != len(types):
+        raise InvalidCursor("Invalid cursor")
+    for v, t in zip(values, types):
+        if not isinstance(v, t) or isinstance(v, bool):
+            raise InvalidCursor("Invalid cursor")
+    return kind, *values
+
+
+def literal(value: str) -> str:
+    """A string from a cursor as a SPARQL literal"""
+    return Literal(value).n3()
@@ -0,0 +1,163 @@
+"""Framing the graph from the asset_detail_graph CONSTRUCT query into an asset's
+detail: the same dicts that the asset_detail, distribution_detail and asset_hrefs
+SELECT queries give, ready for asset._complete_detail."""
+from datetime import datetime
+
+from rdflib import Graph, Literal
+from rdflib.namespace import DCAT, DCTERMS, RDF, RDFS, SKOS, XSD
+
+from app.db.model import ADMS, CDDO_ASSET, CGMEM, VCARD
+from app.utils import lookup_organisation
+
+# Field name: predicate, or (predicate, label predicate) for a value given by the
+# label of the object. As in asset_detail.sparql.
+ASSET_FIELDS = {
+    "accessRights": DCTERMS.accessRights,
+    "catalogueCreated": CDDO_ASSET.created,
+    "catalogueModified": CDDO_ASSET.modified,
+    "created": DCTERMS.created,
+    "description": DCTERMS.description,
+    "endpointDescription": DCAT.endpointDescription,
+    "endpointURL": DCAT.endpointURL,
+    "externalIdentifier": SKOS.notation,
+    "issued": DCTERMS.issued,
+    "licence": DCTERMS.license,
+    "modified": DCTERMS.modified,
+    "organisation": DCTERMS.publisher,
+    "securityClassification": CGMEM.securityClassification,
+    "serviceStatus": ADMS.status,
+    "serviceType": DCTERMS.type,
+    "summary": RDFS.comment,
+    "title": DCTERMS.title,
+    "type": (RDF.type, RDFS.label),
+    "updateFrequency": (DCTERMS.accrualPeriodicity, RDFS.label),
+    "version": DCAT.version,
+}
+ASSET_LIST_FIELDS = {
+    "alternativeTitle": DCTERMS.alternative,
+    "creator": DCTERMS.creator,
+    "distribution": DCAT.distribution,
+    "keyword": DCAT.keyword,
+    "relatedAssets": DCTERMS.relation,
+    "servesDataset": DCAT.servesDataset,
+    "theme": (DCAT.theme, SKOS.prefLabel),
+}
+# Fields the asset_detail query requires, so assets without them aren't found
+ASSET_REQUIRED = [
+    "description",
+    "licence",
+    "organisation",
+    "securityClassification",
+    "title",
+    "type",
+    "version",
+    "catalogueCreated",
+    "catalogueModified",
+]
+
+CONTACT_FIELDS = {
+    "contactName": VCARD.fn,
+    "contactEmail": VCARD.hasEmail,
+    "contactTelephone": VCARD.hasTelephone,
+    "contactAddress": VCARD.hasAddress,
+}
+
+# As in distribution_detail.sparql
+DISTRIBUTION_FIELDS = {
+    "title": DCTERMS.title,
+    "mediaType": (DCAT.mediaType, RDFS.label),
+    "identifier": DCTERMS.identifier,
+    "licence": DCTERMS.license,
+    "issued": DCTERMS.issued,
+    "modified": DCTERMS.modified,
+    "byteSize": DCAT.byteSize,
+    "externalIdentifier": SKOS.notation,
+    "accessService": DCAT.accessService,
+}
+DISTRIBUTION_REQUIRED = ["title", "mediaType", "identifier", "licence"]
+
+
+def _value(term):
+    """A term as a Python value, as Connection gives query results"""
+    if isinstance(term, Literal) and term.datatype == XSD.date:
+        return datetime.fromisoformat(str(term))
+    return str(term)
+
+
+def _objects(graph: Graph, subject, path):
+    if isinstance(path, tuple):
+        predicate, label = path
+        return [
+            l
+            for o in graph.objects(subject, predicate)
+            for l in graph.objects(o, label)
+        ]
+    return list(graph.objects(subject, path))
+
+
+def _fields(graph: Graph, subject, fields: dict) -> dict:
+    values = {}
+    for name, path in fields.items():
+        objects = _objects(graph, subject, path)
+        if objects:
+            values[name] = _value(min(objects))
+    return values
+
+
+def _list_fields(graph: Graph, subject, fields: dict) -> dict:
+    values = {}
+    for name, path in fields.items():
+        objects = _objects(graph, subject, path)
+        if objects:
+            values[name] = sorted({_value(o) for o in objects})
+    return values
+
+
+def _distribution(graph: Graph, distribution):
+    details = _fields(graph, distribution, DISTRIBUTION_FIELDS)
+    if not all(f in details for f in DISTRIBUTION_REQUIRED):
+        return None
+    media_types = graph.objects(distribution, DCAT.mediaType)
+    labels = [l for t in media_types for l in graph.objects(t, SKOS.prefLabel)]
+    if labels:
+        details["mediaType"] = _value(min(labels))
+    details["distribution"] = str(distribution)
+    return details
+
+
+def frame_detail(graph: Graph, asset_id: str):
+    """The asset with the given identifier, its distributions by URI and links to
+    the assets it links to by URI; or None if the graph doesn't have the asset"""
+    subject = graph.value(predicate=DCTERMS.identifier, object=Literal(asset_id))
+    if subject is None:
+        return None
+    asset = _fields(graph, subject, ASSET_FIELDS)
+    asset.update(_list_fields(graph, subject, ASSET_LIST_FIELDS))
+    contact = graph.value(subject, DCAT.contactPoint)
+    if contact is not None:
+        asset.update(_fields(graph, contact, CONTACT_FIELDS))
+    if not all(f in asset for f in ASSET_REQUIRED + ["contactName", "contactEmail"]):
+        return None
+
+    asset["resourceUri"] = str(subject)
+    asset["organisation"] = lookup_organisation(asset["organisation"])
+    if "creator" in asset:
+        asset["creator"] = [lookup_organisation(o) for o in asset["creator"]]
+
+    distributions = {}
+    for d in graph.objects(subject, DCAT.distribution):
+        if details := _distribution(graph, d):
+            distributions[details["distribution"]] = details
+
+    hrefs = {}
+    for path in (DCTERMS.relation, DCAT.servesDataset):
+        for linked in graph.objects(subject, path):
+            identifier = graph.value(linked, DCTERMS.identifier)
+            title = graph.value(linked, DCTERMS.title)
+            if identifier is not None and title is not None:
+                hrefs[str(linked)] = {
+                    "identifier": str(identifier),
+                    "title": str(title),
+                }
+
+    return asset, distributions, hrefs
@@ -5,7 +5,7 @@ from rdflib.namespace import RDF, RDFS, DCTERMS, DCAT, SKOS
 from pydantic.networks import AnyUrl
 from datetime import datetime
 from uuid import UUID, uuid4
-from app.db.reference_data import reference_data_validator
+from app.db.reference_data import ReferenceData
 from app.db.utils import wrap_markdown
 
 
@@ -92,75 +92,78 @@ class ObjectListAttribute:
         return triples
 
 
-predicates_map = {
-    "catalogueCreated": SimpleAttribute(CDDO_ASSET.created),
-    "catalogueModified": SimpleAttribute(CDDO_ASSET.modified),
-    "created": SimpleAttribute(DCTERMS.created),
-    "modified": SimpleAttribute(DCTERMS.modified),
-    "summary": SimpleAttribute(RDFS.comment),
-    "title": SimpleAttribute(DCTERMS.title),
-    "type": SimpleAttribute(RDF.type, value_converter=type_uri),
-    "accessRights": SimpleAttribute(DCTERMS.accessRights),
-    "alternativeTitle": ListAttribute(DCTERMS.alternative),
-    "contactPoint": ObjectAttribute(
-        DCAT.contactPoint,
-        {
-            "name": SimpleAttribute(VCARD.fn),
-            "email": SimpleAttribute(VCARD.hasEmail),
-            "telephone": SimpleAttribute(VCARD.hasTelephone),
-            "address": SimpleAttribute(VCARD.hasAddress),
-        },
-        object_type_uri=VCARD.Kind,
-    ),
-    "description": SimpleAttribute(DCTERMS.description, value_converter=wrap_markdown),
-    "issued": SimpleAttribute(CDDO_ASSET.issued),
-    "keyword": ListAttribute(DCAT.keyword),
-    "licence": SimpleAttribute(DCTERMS.license),
-    "relatedAssets": ListAttribute(DCTERMS.relation),
-    "securityClassification": SimpleAttribute(CGMEM.securityClassification),
-    "theme": ListAttribute(
-        DCAT.theme, value_converter=reference_data_validator.theme_uri
-    ),
-    "version": SimpleAttribute(DCAT.version),
-    "identifier": SimpleAttribute(DCTERMS.identifier),
-    "distributions": ObjectListAttribute(
-        ObjectAttribute(
-            DCAT.distribution,
+def predicates_map(reference: ReferenceData):
+    """How each field of an asset becomes triples, with the vocabularies checked
+    against the given reference data"""
+    return {
+        "catalogueCreated": SimpleAttribute(CDDO_ASSET.created),
+        "catalogueModified": SimpleAttribute(CDDO_ASSET.modified),
+        "created": SimpleAttribute(DCTERMS.created),
+        "modified": SimpleAttribute(DCTERMS.modified),
+        "summary": SimpleAttribute(RDFS.comment),
+        "title": SimpleAttribute(DCTERMS.title),
+        "type": SimpleAttribute(RDF.type, value_converter=type_uri),
+        "accessRights": SimpleAttribute(DCTERMS.accessRights),
+        "alternativeTitle": ListAttribute(DCTERMS.alternative),
+        "contactPoint": ObjectAttribute(
+            DCAT.contactPoint,
             {
-                "title": SimpleAttribute(DCTERMS.title),
-                "modified": SimpleAttribute(DCTERMS.modified),
-                "mediaType": SimpleAttribute(
-                    DCAT.mediaType,
-                    value_converter=reference_data_validator.media_type_uri,
-                ),
-                "identifier": SimpleAttribute(DCTERMS.identifier),
-                "accessService": SimpleAttribute(DCAT.accessService),
-                "issued": SimpleAttribute(CDDO_ASSET.issued),
-                "licence": SimpleAttribute(DCTERMS.license),
-                "byteSize": SimpleAttribute(DCAT.byteSize),
-                "externalIdentifier": SimpleAttribute(SKOS.notation),
+                "name": SimpleAttribute(VCARD.fn),
+                "email": SimpleAttribute(VCARD.hasEmail),
+                "telephone": SimpleAttribute(VCARD.hasTelephone),
+                "address": SimpleAttribute(VCARD.hasAddress),
             },
-            object_id_fn=lambda d: d["distribution"],
-            object_type_uri=DCAT.Distribution,
-        )
-    ),
-    "updateFrequency": SimpleAttribute(
-        DCTERMS.accrualPeriodicity,
-        value_converter=reference_data_validator.update_freq_url,
-    ),
-    "endpointDescription": SimpleAttribute(DCAT.endpointDescription),
-    "endpointURL": SimpleAttribute(DCAT.endpointURL),
-    "servesDataset": ListAttribute(DCAT.servesDataset),
-    "serviceStatus": SimpleAttribute(ADMS.status),
-    "serviceType": SimpleAttribute(DCTERMS.type),
-    "externalIdentifier": SimpleAttribute(SKOS.notation),
-    "organisation": SimpleAttribute(
-        DCTERMS.publisher, value_converter=extract_organisation_slug
-    ),
-    "creator": ListAttribute(
-        DCTERMS.creator, value_converter=extract_organisation_slug
-    ),
-}
+            object_type_uri=VCARD.Kind,
+        ),
+        "description": SimpleAttribute(
+            DCTERMS.description, value_converter=wrap_markdown
+        ),
+        "issued": SimpleAttribute(CDDO_ASSET.issued),
+        "keyword": ListAttribute(DCAT.keyword),
+        "licence": SimpleAttribute(DCTERMS.license),
+        "relatedAssets": ListAttribute(DCTERMS.relation),
+        "securityClassification": SimpleAttribute(CGMEM.securityClassification),
+        "theme": ListAttribute(DCAT.theme, value_converter=reference.theme_uri),
+        "version": SimpleAttribute(DCAT.version),
+        "identifier": SimpleAttribute(DCTERMS.identifier),
+        "distributions": ObjectListAttribute(
+            ObjectAttribute(
+                DCAT.distribution,
+                {
+                    "title": SimpleAttribute(DCTERMS.title),
+                    "modified": SimpleAttribute(DCTERMS.modified),
+                    "mediaType": SimpleAttribute(
+                        DCAT.mediaType,
+                        value_converter=reference.media_type_uri,
+                    ),
+                    "identifier": SimpleAttribute(DCTERMS.identifier),
+                    "accessService": SimpleAttribute(DCAT.accessService),
+                    "issued": SimpleAttribute(CDDO_ASSET.issued),
+                    "licence": SimpleAttribute(DCTERMS.license),
+                    "byteSize": SimpleAttribute(DCAT.byteSize),
+                    "externalIdentifier": SimpleAttribute(SKOS.notation),
+                },
+                object_id_fn=lambda d: d["distribution"],
+                object_type_uri=DCAT.Distribution,
+            )
+        ),
+        "updateFrequency": SimpleAttribute(
+            DCTERMS.accrualPeriodicity,
+            value_converter=reference.update_freq_url,
+        ),
+        "endpointDescription": SimpleAttribute(DCAT.endpointDescription),
+        "endpointURL": SimpleAttribute(DCAT.endpointURL),
+        "servesDataset": ListAttribute(DCAT.servesDataset),
+        "serviceStatus": SimpleAttribute(ADMS.status),
+        "serviceType": SimpleAttribute(DCTERMS.type),
+        "externalIdentifier": SimpleAttribute(SKOS.notation),
+        "organisation": SimpleAttribute(
+            DCTERMS.publisher, value_converter=extract_organisation_slug
+        ),
+        "creator": ListAttribute(
+            DCTERMS.creator, value_converter=extract_organisation_slug
+        ),
+    }
 
 
 def format_term(rdf_term):
@@ -177,12 +180,13 @@ def format_term(rdf_term):
         return str(rdf_term)
 
 
-def asset_to_triples(asset):
+def asset_to_triples(asset, reference: ReferenceData):
     asset_uri = asset["resourceUri"]
+    predicates = predicates_map(reference)
     triples = []
     for k, v in asset.items():
-        if k in predicates_map and v is not None:  # TODO should always be!
-            attribute = predicates_map[k]
+        if k in predicates and v is not None:  # TODO should always be!
+            attribute = predicates[k]
             triples = triples + attribute.to_triples(asset_uri, v)
     triples = [[format_term(term) for term in triple] for triple in triples]
     return triples
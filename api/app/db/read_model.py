@@ -0,0 +1,115 @@
+"""A read model of the catalogue: each asset's detail and summary, serialised once
+when the asset is published and stored in the documents graph, so that reads can
+serve them as they are rather than putting them together from the asset's triples.
+
+Documents are tagged with DOCUMENT_VERSION. Bump it whenever a change to the
+response models or to how they're put together changes the documents: documents of
+another version are ignored, so reads fall back to the triples until
+`python -m app.rebuild_read_model` has regenerated them.
+
+A detail document also records how many catalogue assets the asset linked to when
+it was rendered, as asset_version counts them. Links to assets published later are
+given with their titles, so a document with another count is stale and ignored too.
+Publishing re-stores the documents of the assets that link to what was published."""
+import json
+from typing import Iterable, List
+
+from rdflib import Literal
+
+from app import model as m
+from app.db.sparql import assets_db
+
+DOCUMENT_VERSION = "2"
+
+assets_db.require(
+    {
+        "read_model_put": ["resources", "triples"],
+        "read_model_detail": ["asset_id", "version", "links"],
+        "read_model_summaries": ["resources", "version"],
+    }
+)
+
+
+def _summary(asset: m.DatasetResponse | m.DataServiceResponse, detail: dict):
+    summary = {**detail, "summary": asset.summary or asset.description[:100]}
+    if asset.type == m.assetType.dataset:
+        summary["mediaType"] = sorted({d.mediaType for d in asset.distributions})
+        return m.DatasetSummary.model_validate(summary)
+    return m.DataServiceSummary.model_validate(summary)
+
+
+def render(detail: dict) -> tuple[str, str]:
+    """An asset's detail document, as /catalogue/{asset_id} gives it, and its
+    summary document, as the asset summaries for searches are before validation"""
+    if detail["type"] == m.assetType.dataset:
+        asset = m.DatasetResponse.model_validate(detail)
+    else:
+        asset = m.DataServiceResponse.model_validate(detail)
+    summary = _summary(asset, detail)
+    return asset.model_dump_json(by_alias=True), summary.model_dump_json()
+
+
+def _links(detail: dict) -> int:
+    """How many catalogue assets the detail links to: those given by identifier and
+    title rather than as a plain URI"""
+    linked = detail.get("relatedAssets", []) + detail.get("servesDataset", [])
+    return len({l["identifier"] for l in linked if isinstance(l, dict)})
+
+
+def _triples(detail: dict, detail_document: str, summary_document: str):
+    return "\n    ".join(
+        [
+            f"<{detail['resourceUri']}> dct:identifier {Literal(str(detail['identifier'])).n3()} ;",
+            f'  cddo_asset:documentVersion "{DOCUMENT_VERSION}" ;',
+            f"  cddo_asset:documentLinks {_links(detail)} ;",
+            f"  cddo_asset:detailDocument {Literal(detail_document).n3()} ;",
+            f"  cddo_asset:summaryDocument {Literal(summary_document).n3()} .",
+        ]
+    )
+
+
+async def store(details: Iterable[dict]) -> int:
+    """Render and store the documents of the given asset details, replacing any they
+    had. Returns how many were stored; assets that don't make valid responses are
+    left out, and reads of them fall back to the triples."""
+    resources, triples = [], []
+    for detail in details:
+        try:
+            documents = render(detail)
+        except Exception as e:
+            print(f"Not storing documents for {detail.get('resourceUri')}: {e}")
+            continue
+        resources.append(f"<{detail['resourceUri']}>")
+        triples.append(_triples(detail, *documents))
+    if resources:
+        await assets_db.run_update(
+            "read_model_put",
+            resources=resources,
+            triples="\n    ".join(triples),
+        )
+    return len(resources)
+
+
+async def detail_document(asset_id: str, links: int) -> str | None:
+    """The serialised detail of the asset, if it has a current one: of this version,
+    and rendered when it linked to `links` catalogue assets (see asset_version)"""
+    results = await assets_db.run_query(
+        "read_model_detail",
+        asset_id=str(asset_id),
+        version=DOCUMENT_VERSION,
+        links=int(links),
+    )
+    return results[0]["document"] if results else None
+
+
+async def summaries(resource_uris: List[str]) -> dict:
+    """The summaries of those of the given assets that have a current one, by URI,
+    ready to validate as DatasetSummary or DataServiceSummary"""
+    if not resource_uris:
+        return {}
+    results = await assets_db.run_query(
+        "read_model_summaries",
+        resources=[f"<{uri}>" for uri in resource_uris],
+        version=DOCUMENT_VERSION,
+    )
+    return {r["resourceUri"]: json.loads(r["document"]) for r in results}
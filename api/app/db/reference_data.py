@@ -1,31 +1,45 @@
+"""The vocabularies that published assets are validated against: media types, update
+frequencies and themes.
+
+They're held as an immutable ReferenceData snapshot, loaded with the three queries
+run concurrently before the API starts serving requests, and reloaded every
+REFERENCE_DATA_REFRESH seconds. A reload builds a new snapshot and swaps it in
+with a single assignment. Validation is done by the snapshot itself: a request
+takes the current one once and checks everything against it, so one publish or
+preview never mixes two versions, and gives back the version it used. Each
+snapshot's version is a hash of its contents, so it's the same in every API
+worker with the same data. Snapshots also carry each vocabulary's listing,
+serialised with an ETag, for /themes, /media-types and /update-frequencies to send
+as it is."""
+import asyncio
+import hashlib
+import json
+from collections import namedtuple
+from types import MappingProxyType
+
+from app import config
+from app import model as m
+from app.conditional import etag
 from app.db.sparql import assets_db
 from rdflib.term import URIRef
 from rdflib import Namespace
 
 FREQ = Namespace("http://purl.org/cld/freq/")
 
+VOCABULARY_QUERIES = ["all_mimetypes", "all_update_frequencies", "all_themes"]
 
-class ReferenceDataValidator:
-    _media_types = None
-    _update_frequencies = None
-
-    def _init_media_types(self):
-        self._media_types = {}
-        query_results = assets_db.run_query("all_mimetypes")
-        for r in query_results:
-            self._media_types[r["mimetypeLabel"]] = URIRef(r["mimetypeUri"])
-        return
+assets_db.require({q: [] for q in VOCABULARY_QUERIES})
 
-    def _init_update_frequencies(self):
-        query_results = assets_db.run_query("all_update_frequencies")
-        self._update_frequencies = {URIRef(r["updateFrequency"]) for r in query_results}
-        return
 
+class ReferenceData(
+    namedtuple(
+        "ReferenceData",
+        ["version", "media_types", "update_frequencies", "themes", "payloads"],
+    )
+):
     def media_type_uri(self, media_type_str):
-        if self._media_types is None:
-            self._init_media_types()
         try:
-            return self._media_types[media_type_str]
+            return self.media_types[media_type_str]
         except:
             raise ValueError(f"Invalid media type: {media_type_str}")
 
@@ -33,27 +47,135 @@ class ReferenceDataValidator:
         """For update frequency such as 'freq:quarterly', convert to URI and check it's ok.
         At present this is what we get from the spreadsheet, though at some point we may want
         to support a string label like 'Quarterly'"""
-        if self._update_frequencies is None:
-            self._init_update_frequencies()
         try:
             suffix = update_freq_notation.split("freq:")[1]
         except:
             raise ValueError(f"Invalid update frequency: {update_freq_notation}")
         uri = FREQ[suffix]
-        if uri in self._update_frequencies:
+        if uri in self.update_frequencies:
             return uri
         else:
             raise ValueError(f"Invalid update frequency: {update_freq_notation}")
 
     def theme_uri(self, theme_uri_str):
-        """Since we can't get a list of themes from the DB, just validate themes by checking
-        that they have a label. Not ideal - at some point we'll need to add a type to the themes
-        so we can supply a list of valid options"""
+        """The themes have no type or scheme in the DB, so they're the labelled data.gov.uk
+        topic search URIs (see all_themes.sparql)"""
         theme_as_uri = URIRef(theme_uri_str)
-        query_results = assets_db.run_query("get_label", subject=theme_as_uri)
-        if len(query_results) == 0:
+        if theme_as_uri not in self.themes:
             raise ValueError(f"Invalid theme: {theme_uri_str}")
         return theme_as_uri
 
 
+# A vocabulary's listing, serialised once per snapshot for /themes, /media-types
+# and /update-frequencies
+Payload = namedtuple("Payload", ["body", "etag"])
+
+
+def _version(media_types, update_frequencies, themes) -> str:
+    data = json.dumps(
+        [
+            sorted(media_types.items()),
+            sorted(update_frequencies.items()),
+            sorted(themes.items()),
+        ],
+        separators=(",", ":"),
+    ).encode()
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def _payloads(version, media_types, update_frequencies, themes):
+    listings = {
+        "media-types": [
+            m.MediaType(label=label, uri=uri) for label, uri in media_types.items()
+        ],
+        "update-frequencies": [
+            m.UpdateFrequency(
+                notation="freq:" + uri.removeprefix(str(FREQ)), label=label, uri=uri
+            )
+            for uri, label in update_frequencies.items()
+        ],
+        "themes": [m.Theme(label=label, uri=uri) for uri, label in themes.items()],
+    }
+    return MappingProxyType(
+        {
+            name: Payload(
+                json.dumps(
+                    sorted(
+                        (i.model_dump() for i in items),
+                        key=lambda i: (i["label"] or "").lower(),
+                    )
+                ).encode(),
+                etag(name, version),
+            )
+            for name, items in listings.items()
+        }
+    )
+
+
+def _labels(query_results, uri_var):
+    """URI: label, with the first label of any URI that has more than one"""
+    labels = {}
+    for r in query_results:
+        labels.setdefault(URIRef(r[uri_var]), r.get("label"))
+    return labels
+
+
+def snapshot(mimetypes, update_frequencies, themes) -> ReferenceData:
+    """A snapshot from the results of the VOCABULARY_QUERIES"""
+    media_types = {r["mimetypeLabel"]: URIRef(r["mimetypeUri"]) for r in mimetypes}
+    update_frequencies = _labels(update_frequencies, "updateFrequency")
+    themes = _labels(themes, "theme")
+    version = _version(media_types, update_frequencies, themes)
+    return ReferenceData(
+        version,
+        MappingProxyType(media_types),
+        MappingProxyType(update_frequencies),
+        MappingProxyType(themes),
+        _payloads(version, media_types, update_frequencies, themes),
+    )
+
+
+class ReferenceDataValidator:
+    """Holds the current snapshot. Code that validates assets takes it once, with
+    current(), and uses that snapshot for all of them."""
+
+    def __init__(self):
+        self._snapshot = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._snapshot is not None
+
+    async def current(self) -> ReferenceData:
+        """The current snapshot, loaded first if it hasn't been yet"""
+        return self._snapshot or await self.refresh()
+
+    async def refresh(self) -> ReferenceData:
+        """Load a new snapshot and swap it in"""
+        results = await asyncio.gather(
+            *[assets_db.run_query(q) for q in VOCABULARY_QUERIES]
+        )
+        new = snapshot(*results)
+        if self._snapshot is None or new.version != self._snapshot.version:
+            print(f"Loaded reference data version {new.version}")
+        self._snapshot = new
+        return new
+
+
 reference_data_validator = ReferenceDataValidator()
+
+
+async def maintain():
+    """Reload the reference data every REFERENCE_DATA_REFRESH seconds once it's been
+    loaded at startup, or every minute until it has"""
+    while True:
+        if not reference_data_validator.loaded:
+            await asyncio.sleep(60)
+        elif config.REFERENCE_DATA_REFRESH > 0:
+            await asyncio.sleep(config.REFERENCE_DATA_REFRESH)
+        else:
+            return
+        try:
+            await reference_data_validator.refresh()
+        except Exception as e:
+            print(f"Failed to load the reference data: {e}")
@@ -0,0 +1,242 @@
+"""An in-process search index over the catalogue, so that searches, filters, facet
+counts and paging can be answered without a round trip to the triplestore.
+
+Each asset is given a document number, and sets of documents are Python ints used as
+bitmaps: bit n is set if document n is in the set. The inverted index maps each
+token of an asset's title, summary, description, keywords and alternative titles to
+a bitmap, as does each organisation, theme and asset type. Matching a query is then
+a handful of ORs and ANDs, and a facet count is a popcount.
+
+Matches are ranked like the triplestore's text search: each word of the query
+scores its inverse document frequency, boosted by the most important field of the
+asset it appears in (FIELD_BOOSTS), and an asset's relevance is the sum.
+
+The index is only read and written from the event loop, so it needs no locks."""
+import math
+import re
+from bisect import bisect_left, bisect_right, insort
+from collections import namedtuple
+from typing import Dict, Iterable, List, Tuple
+
+_words = re.compile(r"\w+")
+
+# Fields of the text index and how much a match in each counts towards relevance.
+# The field names match the text index in fuseki/assembler.ttl
+FIELD_BOOSTS = {
+    "title": 4,
+    "alternative": 3,
+    "keyword": 2,
+    "summary": 1.5,
+    "description": 1,
+}
+
+# weights maps each token of the asset's text to the boost of its best field
+Doc = namedtuple("Doc", ["sort_key", "uri", "record", "weights"])
+
+
+def tokenise(text: str) -> List[str]:
+    # Descriptions are stored with their newlines escaped, see dbutils.wrap_markdown
+    return _words.findall(text.replace("\\n", " ").lower())
+
+
+def _bit_positions(bitmap: int):
+    bits = bin(bitmap)[:1:-1]  # Least significant bit first
+    i = bits.find("1")
+    while i != -1:
+        yield i
+        i = bits.find("1", i + 1)
+
+
+def _union(bitmaps: Iterable[int]) -> int:
+    result = 0
+    for b in bitmaps:
+        result |= b
+    return result
+
+
+class _State:
+    def __init__(self):
+        self.docs: List[Doc] = []
+        self.doc_numbers = {}
+        self.live = 0
+        self.postings = {}
+        self.terms = []  # Sorted, for prefix matching
+        self.facets = {"organisation": {}, "theme": {}, "type": {}}
+        self.modified = None  # The latest catalogueModified
+
+    def add(self, record: dict, texts: Iterable[Tuple[str, str]]):
+        uri = record["resourceUri"]
+        if uri in self.doc_numbers:
+            # Replacing an asset: its old document stays in the bitmaps but isn't live
+            self.live &= ~(1 << self.doc_numbers[uri])
+        weights = {}
+        for field, text in texts:
+            boost = FIELD_BOOSTS[field]
+            for token in tokenise(text):
+                weights[token] = max(weights.get(token, 0), boost)
+
+        n = len(self.docs)
+        bit = 1 << n
+        self.docs.append(Doc(record["title"].lower(), uri, record, weights))
+        self.doc_numbers[uri] = n
+        self.live |= bit
+        modified = record.get("catalogueModified")
+        if modified is not None and (self.modified is None or modified > self.modified):
+            self.modified = modified
+
+        for token in weights:
+            if token not in self.postings:
+                self.postings[token] = 0
+                insort(self.terms, token)
+            self.postings[token] |= bit
+
+        facet_values = {
+            "organisation": [record["organisation"].slug],
+            "theme": record.get("theme", []),
+            "type": [record["type"]],
+        }
+        for facet, values in facet_values.items():
+            bitmaps = self.facets[facet]
+            for v in values:
+                bitmaps[v] = bitmaps.get(v, 0) | bit
+
+    def expand(self, prefix: str) -> List[str]:
+        i = j = bisect_left(self.terms, prefix)
+        while j < len(self.terms) and self.terms[j].startswith(prefix):
+            j += 1
+        return self.terms[i:j]
+
+    def query_terms(self, q: str) -> List[List[str]]:
+        """The indexed tokens matching each word of the query. The last word can be
+        the start of a token, as the triplestore's text search does for `q*`"""
+        words = tokenise(q)
+        if not words:
+            return []
+        terms = [[w] if w in self.postings else [] for w in words[:-1]]
+        return terms + [self.expand(words[-1])]
+
+    def match(self, terms: List[List[str]]) -> int:
+        """Documents matching any of the query terms, or every document if there
+        are none"""
+        if not terms:
+            return self.live
+        matches = _union(self.postings[t] for tokens in terms for t in tokens)
+        return matches & self.live
+
+    def idf(self, token: str) -> float:
+        n = self.live.bit_count()
+        df = (self.postings[token] & self.live).bit_count()
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def relevance(self, doc: Doc, terms: List[Dict[str, float]]) -> float:
+        score = 0
+        for idfs in terms:
+            if len(idfs) < len(doc.weights):
+                scores = (
+                    idf * doc.weights[t] for t, idf in idfs.items() if t in doc.weights
+                )
+            else:
+                scores = (idfs[t] * w for t, w in doc.weights.items() if t in idfs)
+            score += max(scores, default=0)
+        return score
+
+    def restrict(self, matches: int, filters: dict) -> int:
+        """Values for the same facet are ORed, different facets are ANDed"""
+        for facet, values in filters.items():
+            if values:
+                bitmaps = self.facets[facet]
+                matches &= _union(bitmaps.get(v, 0) for v in values)
+        return matches
+
+
+class SearchIndex:
+    """The searchable summaries of every asset in the catalogue.
+
+    It is cold (`ready` is False) until it has been loaded, and callers should then
+    search the triplestore instead. A load builds a new index and swaps it in, so
+    searches carry on against the old one meanwhile; assets added during a load are
+    added to both."""
+
+    def __init__(self):
+        self.ready = False
+        self._state = _State()
+        self._added_during_load = None
+
+    def begin_load(self):
+        self._added_during_load = []
+
+    def abort_load(self):
+        self._added_during_load = None
+
+    def load(self, entries: Iterable[Tuple[dict, List[Tuple[str, str]]]]):
+        """Replace the index with the given entries: each is an asset's summary record
+        and its searchable texts, as (field, text) pairs"""
+        state = _State()
+        for record, texts in entries:
+            state.add(record, texts)
+        for record, texts in self._added_during_load or []:
+            state.add(record, texts)
+        self._added_during_load = None
+        self._state = state
+        self.ready = True
+
+    def add(self, entries: Iterable[Tuple[dict, List[Tuple[str, str]]]]):
+        entries = list(entries)
+        for record, texts in entries:
+            self._state.add(record, texts)
+        if self._added_during_load is not None:
+            self._added_during_load.extend(entries)
+
+    def __len__(self):
+        return self._state.live.bit_count()
+
+    def version(self) -> tuple:
+        """The number of assets and the latest date one changed, which identify the
+        index's contents since assets are only ever added"""
+        return len(self), self._state.modified
+
+    def search(self, q: str, filters: dict, limit: int, offset: int, after=None):
+        """One page of matching summary records, most relevant first then by title,
+        and the total number of matches. Records have their `relevance` added if
+        there was a query to be relevant to. If `after` is the (relevance, title,
+        resource URI) of a record, the page starts after it."""
+        state = self._state
+        terms = state.query_terms(q)
+        matches = state.restrict(state.match(terms), filters)
+        docs = [state.docs[n] for n in _bit_positions(matches)]
+        idfs = [{t: state.idf(t) for t in tokens} for tokens in terms]
+        ranked = sorted(
+            (
+                (-state.relevance(d, idfs) if terms else 0, d.sort_key, d.uri, d)
+                for d in docs
+            ),
+            key=lambda r: r[:3],
+        )
+        start = 0
+        if after is not None:
+            relevance, title, uri = after
+            start = bisect_right(
+                ranked, (-(relevance or 0), title, uri), key=lambda r: r[:3]
+            )
+        page = ranked[start + offset : start + offset + limit]
+        if not terms:
+            return [d.record for _, _, _, d in page], len(docs)
+        return [{**d.record, "relevance": -score} for score, _, _, d in page], len(docs)
+
+    def facet_counts(self, q: str, filters: dict) -> dict:
+        """For each facet, rows of {"facet": value, "count": matching assets},
+        like those of the asset_facet_* queries"""
+        state = self._state
+        matches = state.restrict(state.match(state.query_terms(q)), filters)
+        counts = {}
+        for facet, bitmaps in state.facets.items():
+            rows = []
+            for value, bitmap in bitmaps.items():
+                count = (bitmap & matches).bit_count()
+                if count:
+                    rows.append({"facet": value, "count": count})
+            counts[facet] = rows
+        return counts
+
+
+search_index = SearchIndex()
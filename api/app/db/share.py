@@ -3,18 +3,31 @@ from typing import List
 from datetime import datetime
 
 from app.db.sparql import shares_db
+from app.db.cursor import encode_cursor, decode_cursor, literal
 from app import model as m
 
-
-def get_sharedata(user_id: str):
-    query_results = shares_db.run_query("get_sharedata", user_id=user_id)
+shares_db.require(
+    {
+        "get_sharedata": ["user_id"],
+        "upsert": ["id", "user_id", "asset_id", "sharedata", "current_time", "status"],
+        "get_user_created": ["user_id", "after", "limit"],
+        "get_by_org": ["org", "after", "limit"],
+        "get_by_id": ["requestId"],
+        "upsert_notes": ["request_id", "notes"],
+        "upsert_decision": ["request_id", "status", "decisionNotes", "decisionDate"],
+    }
+)
+
+
+async def get_sharedata(user_id: str):
+    query_results = await shares_db.run_query("get_sharedata", user_id=user_id)
     forms = {r["assetId"]: json.loads(r["sharedata"]) for r in query_results}
     return forms
 
 
-def upsert_sharedata(user_id: str, sharedata: m.ShareData):
+async def upsert_sharedata(user_id: str, sharedata: m.ShareData):
     sharedata_string = json.dumps(sharedata.model_dump_json())
-    query_results = shares_db.run_update(
+    query_results = await shares_db.run_update(
         "upsert",
         id=sharedata.requestId,
         user_id=user_id,
@@ -26,18 +39,49 @@ def upsert_sharedata(user_id: str, sharedata: m.ShareData):
     return query_results
 
 
-def created_requests(user_id: str) -> List[m.ShareRequest]:
-    results = shares_db.run_query("get_user_created", user_id=user_id)
-    return results
+def _page_bindings(limit: int | None, cursor: str | None):
+    """Bindings for a page of share requests, which are ordered by when they were last
+    updated, most recent first, then by ID"""
+    after = ""
+    if cursor:
+        _, received, request_id = decode_cursor(cursor, ["shares"], [(str,), (str,)])
+        received, request_id = literal(received), literal(request_id)
+        after = (
+            f"FILTER(?received < {received} || "
+            f"(?received = {received} && ?requestId > {request_id}))"
+        )
+    return {"after": after, "limit": f"LIMIT {int(limit)}" if limit else ""}
 
 
-def received_requests(org: str):
-    results = shares_db.run_query("get_by_org", org=org)
-    return results
+def _next_cursor(results, limit: int | None):
+    if not limit or len(results) < limit:
+        return None
+    last = results[-1]
+    return encode_cursor("shares", last["received"], last["requestId"])
+
 
+async def created_requests(
+    user_id: str, limit: int = None, cursor: str = None
+) -> tuple[List[m.ShareRequest], str | None]:
+    """The share requests the user has made, and a cursor for the next page if
+    `limit` is given and there may be more"""
+    results = await shares_db.run_query(
+        "get_user_created", user_id=user_id, **_page_bindings(limit, cursor)
+    )
+    return results, _next_cursor(results, limit)
 
-def received_request(requestId: str):
-    results = shares_db.run_query("get_by_id", requestId=requestId)
+
+async def received_requests(org: str, limit: int = None, cursor: str = None):
+    """The share requests made to the organisation, and a cursor for the next page
+    if `limit` is given and there may be more"""
+    results = await shares_db.run_query(
+        "get_by_org", org=org, **_page_bindings(limit, cursor)
+    )
+    return results, _next_cursor(results, limit)
+
+
+async def received_request(requestId: str):
+    results = await shares_db.run_query("get_by_id", requestId=requestId)
 
     assert len(results) <= 1, "Found multiple share requests with the same ID"
     if not results:
@@ -46,13 +90,17 @@ def received_request(requestId: str):
     return results[0]
 
 
-def upsert_request_notes(request_id: str, notes: str):
-    results = shares_db.run_update("upsert_notes", request_id=request_id, notes=notes)
+async def upsert_request_notes(request_id: str, notes: str):
+    results = await shares_db.run_update(
+        "upsert_notes", request_id=request_id, notes=notes
+    )
     return results
 
 
-def upsert_decision(request_id: str, status: m.ShareRequestStatus, decisionNotes: str):
-    results = shares_db.run_update(
+async def upsert_decision(
+    request_id: str, status: m.ShareRequestStatus, decisionNotes: str
+):
+    results = await shares_db.run_update(
         "upsert_decision",
         request_id=request_id,
         status=status,
@@ -1,28 +1,128 @@
-from SPARQLWrapper import SPARQLWrapper, JSON, POST
+import asyncio
+import codecs
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from datetime import datetime
-from app import config
-from string import Template
+
+import requests
+from requests.adapters import HTTPAdapter
+from rdflib import Graph
 from rdflib.namespace import XSD
 
+from app import config, metrics
+from app.db.cache import query_cache, in_flight_queries
+from app.db.templates import TemplateRegistry, freeze_bindings
+
+SPARQL_JSON = "application/sparql-results+json,application/json"
+N_TRIPLES = "application/n-triples"
+CHUNK_SIZE = 64 * 1024
+
+_bindings_start = re.compile(r'"bindings"\s*:\s*\[')
+_json_decoder = json.JSONDecoder()
+
+
+def iter_result_bindings(chunks):
+    """Incrementally parse a SPARQL JSON results document from an iterable of byte
+    chunks, yielding each binding as soon as it has been read. Only the binding
+    currently being parsed is held in memory, not the whole document."""
+    chunks = iter(chunks)
+    text = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    while not (start := _bindings_start.search(buffer)):
+        chunk = next(chunks, None)
+        if chunk is None:
+            raise ValueError("SPARQL response has no results bindings")
+        buffer += text.decode(chunk)
+    buffer = buffer[start.end() :]
+    pos = 0
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if buffer.startswith("]", pos):
+            return
+        try:
+            binding, pos = _json_decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            chunk = next(chunks, None)
+            if chunk is None:
+                raise
+            buffer = buffer[pos:] + text.decode(chunk)
+            pos = 0
+            continue
+        yield binding
+
 
 class Connection:
-    def __init__(self, query_url=None, update_url=None, query_template_dir="queries"):
+    """A connection to the triplestore's query and update endpoints.
+
+    HTTP connections are kept alive in a pool shared by all calls on this connection.
+    `run_query` and `run_update` are awaitable: the HTTP call happens on a worker thread
+    (one per pooled connection) so a slow query doesn't block the event loop.
+    `run_query_sync` and `run_update_sync` are there for code that isn't async.
+
+    Results are parsed from the response as it streams in; use `stream_query` to
+    process them one at a time rather than building the full list. `construct` runs a
+    CONSTRUCT query and gives its graph.
+
+    Query templates are loaded from `query_template_dir` once, when the connection is
+    created. Modules declare the templates they use with `require` so that a missing
+    template stops the app from starting rather than failing mid-request.
+
+    Query results are cached (see `app.db.cache`), shared between all connections
+    since their queries read each others' graphs. An update drops the cached results
+    of every query that reads a graph the update writes to.
+
+    Identical queries (same template and bindings) that run at the same time are
+    coalesced: only the first goes to the triplestore, the rest wait for its results.
+    Queries run with `cache=False` skip both, so that one-off reads of the whole
+    catalogue (the export) stream straight through without filling the cache."""
+
+    def __init__(
+        self,
+        query_url=None,
+        update_url=None,
+        query_template_dir="queries",
+        pool_size=config.SPARQL_POOL_SIZE,
+        timeout=(config.SPARQL_CONNECT_TIMEOUT, config.SPARQL_READ_TIMEOUT),
+        cache=query_cache,
+        in_flight=in_flight_queries,
+    ):
         self.query_dir = query_template_dir
-        if query_url:
-            self.reader = SPARQLWrapper(query_url)
-            self.reader.setReturnFormat(JSON)
-        if update_url:
-            self.writer = SPARQLWrapper(update_url)
-            self.writer.setReturnFormat(JSON)
-            self.writer.method = POST
-
-    def _prep_query(self, query_file_name, bindings={}):
-        for k, v in bindings.items():
-            if isinstance(v, list):
-                bindings[k] = " ".join(v)
-        with open(f"{self.query_dir}/{query_file_name}.sparql", "r") as f:
-            template = Template(f.read())
-        return template.substitute(bindings)
+        self.cache = cache
+        self.in_flight = in_flight
+        self.templates = TemplateRegistry(query_template_dir)
+        self.query_url = query_url
+        self.update_url = update_url
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Accept": SPARQL_JSON})
+        self.executor = ThreadPoolExecutor(
+            max_workers=pool_size, thread_name_prefix="sparql"
+        )
+
+    def _prep_query(self, query_name, bindings={}):
+        return self.templates[query_name].render(freeze_bindings(bindings))
+
+    @staticmethod
+    def _record(template, kind, started, size, rows=None, failed=False):
+        duration = time.perf_counter() - started
+        labels = {"query": template.label, "graph": template.graph_label}
+        metrics.sparql_duration.observe(duration, kind=kind, **labels)
+        metrics.sparql_response_bytes.inc(size, **labels)
+        if failed:
+            metrics.sparql_errors.inc(kind=kind, **labels)
+        if rows is not None:
+            metrics.sparql_rows.observe(rows, **labels)
+        metrics.slow_queries.record(duration, rows=rows, **labels)
+
+    def require(self, queries):
+        self.templates.require(queries)
 
     @staticmethod
     def _query_result_to_dict(result):
@@ -34,18 +134,183 @@ class Connection:
                 d[k] = v["value"]
         return d
 
-    def run_update(self, query_name, **bindings):
-        assert self.writer, f"No writer configured for {self.graph}"
+    def run_update_sync(self, query_name, **bindings):
+        assert self.update_url, f"No writer configured for {self.query_dir}"
         q = self._prep_query(query_name, bindings)
-        self.writer.setQuery(q)
-        return self.writer.queryAndConvert()
+        template = self.templates[query_name]
+        started = time.perf_counter()
+        size = 0
+        try:
+            response = self.session.post(
+                self.update_url, data={"update": q}, timeout=self.timeout
+            )
+            size = len(response.content)
+            response.raise_for_status()
+            result = response.json()
+        except Exception:
+            self._record(template, "update", started, size, failed=True)
+            raise
+        finally:
+            self.cache.invalidate(template.graphs)
+            self.in_flight.forget(template.graphs)
+        self._record(template, "update", started, size)
+        return result
 
-    def run_query(self, query_name, **bindings):
-        assert self.reader, f"No reader configured for {self.graph}"
-        q = self._prep_query(query_name, bindings)
-        self.reader.setQuery(q)
-        results = self.reader.queryAndConvert()["results"]["bindings"]
-        return [self._query_result_to_dict(r) for r in results]
+    def iter_query_sync(self, query_name, cache=True, **bindings):
+        """Run a query and yield each result as it is read from the response.
+        If the same query has been run recently the results come from the cache,
+        and if it is running right now we wait for its results instead, unless
+        `cache` is False."""
+        assert self.query_url, f"No reader configured for {self.query_dir}"
+        template = self.templates[query_name]
+        frozen = freeze_bindings(bindings)
+        if cache:
+            results = self._raw_results(
+                template, frozen, self.cache.key(template.label, frozen)
+            )
+        else:
+            results = self._fetch_bindings(template, template.render(frozen))
+        for r in results:
+            yield self._query_result_to_dict(r)
+
+    def iter_triples_sync(self, query_name, **bindings):
+        """Run a CONSTRUCT query and yield each triple of the graph it gives, as
+        rdflib terms. Cached and coalesced like other queries."""
+        assert self.query_url, f"No reader configured for {self.query_dir}"
+        template = self.templates[query_name]
+        frozen = freeze_bindings(bindings)
+        key = self.cache.key(template.label, frozen)
+        yield from self._raw_results(template, frozen, key, self._fetch_triples)
+
+    def _raw_results(self, template, frozen, key, fetch=None):
+        fetch = fetch or self._fetch_bindings
+        cached = self.cache.get(key, template.label) if self.cache.enabled else None
+        if cached is not None:
+            yield from cached
+            return
+
+        call, leader = self.in_flight.join(key, template.graphs)
+        if not leader:
+            shared = call.result()
+            if shared is not None:
+                yield from shared
+            else:
+                yield from fetch(template, template.render(frozen))
+            return
+
+        generation = self.cache.generation(template.graphs)
+        results = []
+        try:
+            for r in fetch(template, template.render(frozen)):
+                if results is not None:
+                    results.append(r)
+                    if len(results) > self.cache.max_rows:
+                        results = None
+                yield r
+        except Exception as e:
+            self.in_flight.finish(key, call, error=e)
+            raise
+        except BaseException:
+            # The caller stopped reading; let anyone waiting run the query themselves
+            self.in_flight.finish(key, call)
+            raise
+        self.in_flight.finish(key, call, results)
+        if results is not None and self.cache.enabled:
+            self.cache.put(key, template.graphs, results, generation)
+
+    def _fetch_bindings(self, template, q):
+        """Run a query, yielding the raw JSON bindings as they are parsed"""
+        started = time.perf_counter()
+        size = rows = 0
+        failed = False
+
+        def counted(chunks):
+            nonlocal size
+            for chunk in chunks:
+                size += len(chunk)
+                yield chunk
+
+        try:
+            with self.session.post(
+                self.query_url, data={"query": q}, timeout=self.timeout, stream=True
+            ) as response:
+                response.raise_for_status()
+                chunks = counted(response.iter_content(CHUNK_SIZE))
+                for r in iter_result_bindings(chunks):
+                    rows += 1
+                    yield r
+        except GeneratorExit:
+            raise
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._record(template, "query", started, size, rows, failed)
+
+    def _fetch_triples(self, template, q):
+        """Run a CONSTRUCT query, yielding the triples of the graph it gives"""
+        started = time.perf_counter()
+        size = 0
+        try:
+            response = self.session.post(
+                self.query_url,
+                data={"query": q},
+                headers={"Accept": N_TRIPLES},
+                timeout=self.timeout,
+            )
+            size = len(response.content)
+            response.raise_for_status()
+            graph = Graph().parse(data=response.content.decode(), format="nt")
+        except Exception:
+            self._record(template, "query", started, size, failed=True)
+            raise
+        self._record(template, "query", started, size, len(graph))
+        yield from graph
+
+    def run_query_sync(self, query_name, cache=True, **bindings):
+        return list(self.iter_query_sync(query_name, cache, **bindings))
+
+    async def _in_worker(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(fn, *args, **kwargs))
+
+    async def run_update(self, query_name, **bindings):
+        return await self._in_worker(self.run_update_sync, query_name, **bindings)
+
+    async def run_query(self, query_name, cache=True, **bindings):
+        return await self.stream_query(query_name, list, cache, **bindings)
+
+    async def construct(self, query_name, **bindings) -> Graph:
+        """The graph given by a CONSTRUCT query"""
+
+        def run():
+            graph = Graph()
+            for triple in self.iter_triples_sync(query_name, **bindings):
+                graph.add(triple)
+            return graph
+
+        return await self._in_worker(run)
+
+    async def stream_query(self, query_name, pipeline, cache=True, **bindings):
+        """Feed the results of a query through `pipeline` as they arrive, returning
+        whatever the pipeline returns. The pipeline runs on the worker thread, so it
+        should consume the results lazily (e.g. a chain of generators)."""
+        template = self.templates[query_name]
+        key = self.cache.key(template.label, freeze_bindings(bindings))
+        call = self.in_flight.get(key) if cache else None
+        if call is not None:
+            # Wait for the identical query that's already running without tying up
+            # a worker thread, then only use one to run the pipeline
+            shared = await asyncio.wrap_future(call)
+            if shared is not None:
+                return await self._in_worker(
+                    lambda: pipeline(self._query_result_to_dict(r) for r in shared)
+                )
+
+        def run():
+            return pipeline(self.iter_query_sync(query_name, cache, **bindings))
+
+        return await self._in_worker(run)
 
 
 assets_db = Connection(
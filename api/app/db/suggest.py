@@ -0,0 +1,133 @@
+"""Typeahead suggestions for the catalogue search box, from an in-memory prefix index
+of asset titles, keywords, topics and publishing organisations.
+
+The index is a pair of sorted arrays: one of every suggestion's normalised text, and
+one of every word-start within those texts (so "traffic" finds "Road traffic
+accidents"). A lookup is a bisect into each array followed by a short scan, so it
+takes microseconds and never returns more than the limit asked for.
+
+It's built at startup, rebuilt after each publish, and rebuilt periodically to pick
+up assets published through other API workers. Until it's built there are no
+suggestions."""
+import asyncio
+import re
+from bisect import bisect_left
+from collections import namedtuple
+from typing import Iterable, List
+
+from app import config, utils
+from app.db.sparql import assets_db
+
+assets_db.require({"suggest_terms": []})
+
+Suggestion = namedtuple("Suggestion", ["text", "type", "id"])
+
+_words = re.compile(r"\w+")
+
+
+def normalise(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+class PrefixIndex:
+    def __init__(self, suggestions: Iterable[Suggestion] = ()):
+        self.suggestions = list(dict.fromkeys(suggestions))
+        starts, word_starts = [], []
+        for n, s in enumerate(self.suggestions):
+            key = normalise(s.text)
+            starts.append((key, n))
+            word_starts += [
+                (key[w.start() :], n) for w in _words.finditer(key) if w.start() > 0
+            ]
+        starts.sort()
+        word_starts.sort()
+        self._keys = ([k for k, _ in starts], [k for k, _ in word_starts])
+        self._ids = ([n for _, n in starts], [n for _, n in word_starts])
+
+    def __len__(self):
+        return len(self.suggestions)
+
+    def lookup(self, prefix: str, limit: int) -> List[Suggestion]:
+        """Suggestions starting with the prefix, then those with a later word starting
+        with it, alphabetically"""
+        prefix = normalise(prefix)
+        if not prefix:
+            return []
+        found = {}
+        for keys, ids in zip(self._keys, self._ids):
+            i = bisect_left(keys, prefix)
+            while i < len(keys) and len(found) < limit and keys[i].startswith(prefix):
+                found.setdefault(ids[i], None)
+                i += 1
+        return [self.suggestions[n] for n in found]
+
+
+index = PrefixIndex()
+ready = False
+
+
+def _organisation_title(slug):
+    try:
+        return utils.lookup_organisation(slug).title
+    except ValueError:
+        return None
+
+
+def _to_suggestions(query_results):
+    for r in query_results:
+        if r["type"] == "organisation":
+            title = _organisation_title(r["id"])
+            if title:
+                yield Suggestion(title, "organisation", r["id"])
+        else:
+            yield Suggestion(r["text"], r["type"], r.get("id"))
+
+
+async def build():
+    global index, ready
+    index = await assets_db.stream_query(
+        "suggest_terms", lambda results: PrefixIndex(_to_suggestions(results))
+    )
+    ready = True
+
+
+def suggest(prefix: str, limit: int) -> List[Suggestion]:
+    return index.lookup(prefix, limit)
+
+
+_rebuild = None
+_rebuild_again = False
+
+
+def refresh_after_publish():
+    """Rebuild the index in the background. Publishes that happen during a rebuild are
+    picked up by one more rebuild after it, rather than one each."""
+    global _rebuild, _rebuild_again
+    if _rebuild is not None and not _rebuild.done():
+        _rebuild_again = True
+        return
+
+    async def rebuild():
+        global _rebuild_again
+        while True:
+            _rebuild_again = False
+            try:
+                await build()
+            except Exception as e:
+                print(f"Failed to rebuild the suggestions index: {e}")
+            if not _rebuild_again:
+                return
+
+    _rebuild = asyncio.create_task(rebuild())
+
+
+async def maintain():
+    """Build the index, then rebuild it every SUGGEST_REFRESH seconds"""
+    while True:
+        try:
+            await build()
+        except Exception as e:
+            print(f"Failed to build the suggestions index: {e}")
+        if config.SUGGEST_REFRESH <= 0 and ready:
+            return
+        await asyncio.sleep(config.SUGGEST_REFRESH or 60)
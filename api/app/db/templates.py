@@ -0,0 +1,76 @@
+import re
+from pathlib import Path
+from string import Template
+from types import MappingProxyType
+from typing import Iterable, Mapping
+
+_graph_names = re.compile(r"\b(?:FROM|WITH|GRAPH)\s+cddo_graph:(\w+)", re.IGNORECASE)
+
+
+class QueryTemplate:
+    """A single .sparql file, read and parsed once"""
+
+    def __init__(self, name: str, text: str, label: str = None):
+        self.name = name
+        # Identifies the query in metrics, e.g. "user/get_by_id"
+        self.label = label or name
+        self.text = text
+        self.template = Template(text)
+        if not self.template.is_valid():
+            raise ValueError(f"Query template {name} has invalid placeholders")
+        self.placeholders = frozenset(self.template.get_identifiers())
+        # The named graphs the query reads from or writes to, e.g. {"assets"}
+        self.graphs = frozenset(_graph_names.findall(text))
+        self.graph_label = ",".join(sorted(self.graphs))
+
+    def render(self, bindings: Mapping[str, str]) -> str:
+        missing = self.placeholders - bindings.keys()
+        if missing:
+            raise ValueError(
+                f"Missing bindings for query {self.name}: {', '.join(sorted(missing))}"
+            )
+        return self.template.substitute(bindings)
+
+
+class TemplateRegistry:
+    """All of the query templates in a directory, loaded when the registry is created
+    so that nothing is read from disk while handling a request"""
+
+    def __init__(self, template_dir: str):
+        self.template_dir = template_dir
+        path = Path(template_dir)
+        if not path.is_dir():
+            raise FileNotFoundError(
+                f"Query template directory {template_dir} not found"
+            )
+        self.templates = MappingProxyType(
+            {
+                p.stem: QueryTemplate(p.stem, p.read_text(), f"{path.name}/{p.stem}")
+                for p in sorted(path.glob("*.sparql"))
+            }
+        )
+
+    def __getitem__(self, name: str) -> QueryTemplate:
+        try:
+            return self.templates[name]
+        except KeyError:
+            raise KeyError(f"No query template {name} in {self.template_dir}")
+
+    def require(self, queries: Mapping[str, Iterable[str]]):
+        """Check that each named template exists and that its placeholders are exactly
+        the bindings the caller is going to supply. Call this at import time so a
+        missing or mismatched template stops the app from starting."""
+        for name, bindings in queries.items():
+            template = self[name]
+            if template.placeholders != set(bindings):
+                raise ValueError(
+                    f"Query template {name} expects bindings "
+                    f"{sorted(template.placeholders)}, got {sorted(bindings)}"
+                )
+
+
+def freeze_bindings(bindings: Mapping) -> Mapping[str, str]:
+    """A read-only copy of the bindings with list values joined, ready for rendering"""
+    return MappingProxyType(
+        {k: " ".join(v) if isinstance(v, list) else v for k, v in bindings.items()}
+    )
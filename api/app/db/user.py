@@ -5,10 +5,23 @@ from app import model as m
 from app.db.sparql import users_db
 from app.utils import lookup_organisation
 
-
-def new_user(user_id: str, user_email: str) -> m.RegisteredUser:
-    users_db.run_update("create", user_id=user_id, user_email=user_email)
-    user = get_by_id(user_id)
+users_db.require(
+    {
+        "create": ["user_id", "user_email"],
+        "list": [],
+        "get_by_id": ["user_id"],
+        "delete_by_id": ["user_id"],
+        "edit_org": ["user_id", "org"],
+        "complete_profile": ["user_id", "org", "jobTitle"],
+        "remove_permissions": ["user_id", "to_remove"],
+        "add_permissions": ["user_id", "to_add"],
+    }
+)
+
+
+async def new_user(user_id: str, user_email: str) -> m.RegisteredUser:
+    await users_db.run_update("create", user_id=user_id, user_email=user_email)
+    user = await get_by_id(user_id)
     return user
 
 
@@ -30,14 +43,14 @@ def _query_result_to_user(aggregated_query_result_for_user):
     return m.RegisteredUser.model_validate(user)
 
 
-def list_users() -> List[m.RegisteredUser]:
-    query_results = users_db.run_query("list")
+async def list_users() -> List[m.RegisteredUser]:
+    query_results = await users_db.run_query("list")
     users = aggregate_query_results_by_key(query_results, group_key="id")
     return [_query_result_to_user(u) for u in users]
 
 
-def get_by_id(user_id: str) -> m.RegisteredUser | None:
-    query_results = users_db.run_query("get_by_id", user_id=user_id)
+async def get_by_id(user_id: str) -> m.RegisteredUser | None:
+    query_results = await users_db.run_query("get_by_id", user_id=user_id)
     if not query_results:
         return None
     assert (
@@ -47,28 +60,28 @@ def get_by_id(user_id: str) -> m.RegisteredUser | None:
     return _query_result_to_user(user)
 
 
-def delete_by_id(user_id: str) -> m.SPARQLUpdate:
-    res = users_db.run_update("delete_by_id", user_id=user_id)
+async def delete_by_id(user_id: str) -> m.SPARQLUpdate:
+    res = await users_db.run_update("delete_by_id", user_id=user_id)
     return res
 
 
-def edit_org(user_id, org):
-    res = users_db.run_update("edit_org", user_id=user_id, org=org)
+async def edit_org(user_id, org):
+    res = await users_db.run_update("edit_org", user_id=user_id, org=org)
     return res
 
 
-def complete_profile(user_id, org, jobTitle):
-    res = users_db.run_update(
+async def complete_profile(user_id, org, jobTitle):
+    res = await users_db.run_update(
         "complete_profile", user_id=user_id, org=org, jobTitle=jobTitle
     )
     return res
 
 
-def edit_permissions(user_id, permissions_to_add, permissions_to_remove):
+async def edit_permissions(user_id, permissions_to_add, permissions_to_remove):
     to_add = [f'"{val}"' for val in permissions_to_add]
     res = {"statusCode": 200, "message": "no update required"}
     if permissions_to_remove != []:
-        res = users_db.run_update(
+        res = await users_db.run_update(
             "remove_permissions",
             user_id=user_id,
             to_remove=[f'"{val}"' for val in permissions_to_remove],
@@ -76,5 +89,7 @@ def edit_permissions(user_id, permissions_to_add, permissions_to_remove):
         if res["statusCode"] != 200:
             return res
     if permissions_to_add != []:
-        res = users_db.run_update("add_permissions", user_id=user_id, to_add=to_add)
+        res = await users_db.run_update(
+            "add_permissions", user_id=user_id, to_add=to_add
+        )
     return res
@@ -24,11 +24,11 @@ def aggregate_results(result_dicts):
 
 
 def aggregate_query_results_by_key(results, group_key="resourceUri"):
-    """Groups the result by given key and aggregates the groups into a single dictionary for each"""
-    return [
-        aggregate_results(list(results_for_resource))
-        for _, results_for_resource in groupby(results, lambda r: r[group_key])
-    ]
+    """Groups the result by given key and aggregates the groups into a single dictionary for each.
+    Results must be ordered by the key. Yields each group as soon as it is complete, so only one
+    group's rows are held at a time"""
+    for _, results_for_resource in groupby(results, lambda r: r[group_key]):
+        yield aggregate_results(list(results_for_resource))
 
 
 def _convert_multival_fields_to_lists(asset_result_dict):
@@ -61,6 +61,11 @@ def enrich_query_result_dict(asset_result_dict):
     return enriched
 
 
+def enrich_query_results(asset_result_dicts):
+    for r in asset_result_dicts:
+        yield enrich_query_result_dict(r)
+
+
 def munge_asset_summary_response(result_dict):
     r = result_dict.copy()
     # If summary doesn't exist, set it to be a truncated description
@@ -71,6 +76,11 @@ def munge_asset_summary_response(result_dict):
     return r
 
 
+def munge_asset_summary_responses(result_dicts):
+    for r in result_dicts:
+        yield munge_asset_summary_response(r)
+
+
 def enrich_user_org(user):
     u = user.copy()
     org = u.get("org", None)
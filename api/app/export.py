@@ -0,0 +1,156 @@
+"""Serialising the whole catalogue for /catalogue/export, one asset at a time, so that
+the response can be streamed without holding the catalogue in memory.
+
+Once the response has started its status can't change, so every export ends with
+a trailer saying how many assets it has, which were left out for being invalid and
+whether it's complete or was cut short by an error. In NDJSON it's the last line,
+{"_export": {...}}; in CSV it's a last row of "#export" and the same JSON."""
+import csv
+import io
+import json
+import traceback
+from typing import AsyncIterator
+
+from pydantic import ValidationError
+
+from app import metrics
+from app import model as m
+
+csv_columns = [
+    "identifier",
+    "type",
+    "title",
+    "alternativeTitle",
+    "summary",
+    "description",
+    "keyword",
+    "theme",
+    "organisation",
+    "creator",
+    "contactPoint_contactName",
+    "contactPoint_email",
+    "version",
+    "issued",
+    "modified",
+    "created",
+    "catalogueCreated",
+    "catalogueModified",
+    "updateFrequency",
+    "licence",
+    "accessRights",
+    "securityClassification",
+    "externalIdentifier",
+    "relatedAssets",
+    "distributions",
+    "serviceType",
+    "serviceStatus",
+    "endpointURL",
+    "endpointDescription",
+    "servesDataset",
+]
+
+
+class _Summary:
+    def __init__(self):
+        self.assets = 0
+        self.skipped = []
+        self.error = None
+
+    def skip(self, asset: dict, reason: str):
+        print(f"Leaving asset {asset.get('identifier')} out of the export: {reason}")
+        metrics.export_assets_skipped.inc()
+        self.skipped.append({"identifier": asset.get("identifier"), "error": reason})
+
+    def trailer(self) -> str:
+        return json.dumps(
+            {
+                "_export": {
+                    "assets": self.assets,
+                    "skipped": self.skipped,
+                    "complete": self.error is None,
+                    "error": self.error,
+                }
+            }
+        )
+
+
+def _reason(e: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(l) for l in error['loc'])}: {error['msg']}"
+        for error in e.errors()
+    )
+
+
+async def _validated(assets: AsyncIterator[dict], summary: _Summary):
+    """The valid assets, as response models. Invalid ones are left out, and an error
+    reading the assets ends the export, rather than failing the whole response;
+    both are recorded in the summary."""
+    try:
+        async for asset in assets:
+            try:
+                if asset["type"] == m.assetType.dataset:
+                    model = m.DatasetResponse.model_validate(asset)
+                elif asset["type"] == m.assetType.service:
+                    model = m.DataServiceResponse.model_validate(asset)
+                else:
+                    summary.skip(asset, f"Unknown asset type {asset['type']}")
+                    continue
+            except ValidationError as e:
+                summary.skip(asset, _reason(e))
+                continue
+            summary.assets += 1
+            yield model
+    except Exception as e:
+        traceback.print_exc()
+        metrics.export_failures.inc()
+        summary.error = f"The export stopped after {summary.assets} assets: {e}"
+
+
+async def ndjson_lines(assets: AsyncIterator[dict]):
+    """One asset per line, then the trailer"""
+    summary = _Summary()
+    async for asset in _validated(assets, summary):
+        yield asset.model_dump_json(by_alias=True) + "\n"
+    yield summary.trailer() + "\n"
+
+
+def _csv_value(value):
+    """Lists are joined with commas, as in the CSV files for publishing, and links to
+    other assets or organisations are given by their identifier"""
+    if isinstance(value, list):
+        return ",".join(_csv_value(v) for v in value)
+    if isinstance(value, dict):
+        return value.get("identifier") or value.get("slug") or ""
+    if value is None:
+        return ""
+    return str(value)
+
+
+def _csv_row(asset: dict):
+    contact = asset.get("contactPoint") or {}
+    row = {
+        **asset,
+        "contactPoint_contactName": contact.get("name"),
+        "contactPoint_email": contact.get("email"),
+        "distributions": asset.get("distributions", []),
+    }
+    return [_csv_value(row.get(c)) for c in csv_columns]
+
+
+async def csv_lines(assets: AsyncIterator[dict]):
+    """A header row, one row per asset, then the trailer. Distributions are listed by
+    identifier; use the NDJSON export for their details."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def line(row):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(row)
+        return buffer.getvalue()
+
+    summary = _Summary()
+    yield line(csv_columns)
+    async for asset in _validated(assets, summary):
+        yield line(_csv_row(asset.model_dump(mode="json")))
+    yield line(["#export", summary.trailer()])
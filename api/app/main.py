@@ -1,5 +1,8 @@
+import asyncio
+import time
+from datetime import date
 from uuid import UUID
-from typing import Annotated, List, Union, Optional
+from typing import Annotated, List, Literal, Union, Optional
 from fastapi import (
     FastAPI,
     Body,
@@ -9,12 +12,16 @@ from fastapi import (
     UploadFile,
     Header,
     Depends,
+    Request,
+    Response,
 )
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 
-from app import utils
+from app import utils, metrics, config, export, conditional, organisations
 from app import model as m
 from app.db import asset as asset_db, user as user_db, share as share_db
+from app.db import read_model, reference_data, suggest
+from app.db.cursor import InvalidCursor
 from app.publish import csv as pubcsv, response as pubres, create_asset as publish
 from app.auth.jwt_bearer import JWTBearer, authenticated_user
 from app.routers.users import router as users_router
@@ -25,42 +32,226 @@ app = FastAPI(title="CDDO Data Marketplace API", version="0.1.0")
 app.include_router(users_router)
 app.include_router(shares_router)
 
-# TODO: in order to find out what filters are available, we need
-# and endpoint to return all of the available organisations, themes, and types.
-# Something like this, except we'll need to figure out how themes work.
-# May not need it for types seeing as we only have 2
+
+_background_tasks = set()
+
+
+def _run_in_background(coro):
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+@app.on_event("startup")
+async def start_indexes():
+    await organisations.registry.load()
+    _run_in_background(organisations.maintain())
+    try:
+        # Before serving requests, so that publishing never loads it on the event loop
+        await reference_data.reference_data_validator.refresh()
+    except Exception as e:
+        print(f"Failed to load the reference data: {e}")
+    if config.SEARCH_INDEX:
+        _run_in_background(asset_db.maintain_search_index())
+    _run_in_background(suggest.maintain())
+    _run_in_background(reference_data.maintain())
+
+
+@app.middleware("http")
+async def record_request_timing(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    metrics.http_request_duration.observe(
+        time.perf_counter() - started,
+        method=request.method,
+        route=route.path if route else "unmatched",
+        status=response.status_code,
+    )
+    return response
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/metrics/slow-queries", include_in_schema=False)
+async def slow_queries():
+    return metrics.slow_queries.entries()
 
 
 @app.get("/organisations", tags=["metadata"])
-async def list_organisations() -> List[m.Organisation]:
-    return sorted(
-        [m.Organisation.model_validate(utils.orgs[o]) for o in utils.MVP_ORGS],
+async def list_organisations(
+    request: Request, response: Response
+) -> List[m.Organisation]:
+    mvp_orgs = sorted(
+        [
+            utils.lookup_organisation(o)
+            for o in utils.MVP_ORGS
+            if o in organisations.registry
+        ],
         key=lambda o: o.title,
     )
+    tag = conditional.etag([o.model_dump(mode="json") for o in mvp_orgs])
+    if cached := conditional.not_modified(request, response, "organisations", tag):
+        return cached
+    return mvp_orgs
+
+
+async def _vocabulary(request: Request, name: str):
+    snapshot = await reference_data.reference_data_validator.current()
+    body, tag = snapshot.payloads[name]
+    response = Response(body, media_type="application/json")
+    return conditional.not_modified(request, response, "vocabularies", tag) or response
+
+
+@app.get("/themes", tags=["metadata"])
+async def list_themes(request: Request) -> List[m.Theme]:
+    return await _vocabulary(request, "themes")
+
+
+@app.get("/media-types", tags=["metadata"])
+async def list_media_types(request: Request) -> List[m.MediaType]:
+    return await _vocabulary(request, "media-types")
+
+
+@app.get("/update-frequencies", tags=["metadata"])
+async def list_update_frequencies(request: Request) -> List[m.UpdateFrequency]:
+    return await _vocabulary(request, "update-frequencies")
 
 
 # TODO: add theme query param
 @app.get("/catalogue", tags=["data"])
-def search_catalogue(
+async def search_catalogue(
+    request: Request,
+    response: Response,
     query: str = "",
     topic: Annotated[List[str], Query()] = [],
     organisation: Annotated[List[str], Query()] = [],
     assetType: Annotated[List[m.assetType], Query()] = [],
-    limit: int = 100,
-    offset: int = 0,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+    offset: Annotated[int, Query(ge=0)] = 0,
+    cursor: str = None,
 ) -> m.SearchAssetsResponse:
-    assets = asset_db.search(query, organisations=organisation, themes=topic)
-    facets = {"topics": [], "organisations": [], "assetTypes": []}
+    tag = conditional.request_etag(request, *await asset_db.catalogue_version())
+    if cached := conditional.not_modified(request, response, "catalogue", tag):
+        return cached
 
-    response = {"data": assets, "facets": facets}
+    try:
+        (assets, total, next_cursor), facets = await asyncio.gather(
+            asset_db.search(
+                query,
+                organisations=organisation,
+                themes=topic,
+                asset_types=assetType,
+                limit=limit,
+                offset=offset,
+                cursor=cursor,
+            ),
+            asset_db.facets(
+                query, organisations=organisation, themes=topic, asset_types=assetType
+            ),
+        )
+    except InvalidCursor as e:
+        raise HTTPException(400, str(e))
+
+    response = {
+        "data": assets,
+        "total": total,
+        "nextCursor": next_cursor,
+        "facets": facets,
+    }
 
     r = m.SearchAssetsResponse.model_validate(response)
     return r
 
 
+@app.get("/catalogue/suggest", tags=["data"])
+async def suggest_search_terms(
+    q: str, limit: Annotated[int, Query(ge=1, le=50)] = 10
+) -> List[m.Suggestion]:
+    return [m.Suggestion.model_validate(s._asdict()) for s in suggest.suggest(q, limit)]
+
+
+@app.get(
+    "/catalogue/export",
+    tags=["data"],
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "content": {"application/x-ndjson": {}, "text/csv": {}},
+            "description": "Every asset in full, one per line or row",
+        }
+    },
+)
+async def export_catalogue(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    modifiedSince: Annotated[
+        date | None,
+        Query(description="Only assets changed in the catalogue on or after this date"),
+    ] = None,
+):
+    assets = asset_db.export_details(modified_since=modifiedSince)
+    if format == "csv":
+        return StreamingResponse(
+            export.csv_lines(assets),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="catalogue.csv"'},
+        )
+    return StreamingResponse(
+        export.ndjson_lines(assets), media_type="application/x-ndjson"
+    )
+
+
+@app.post("/catalogue/batch", tags=["data"])
+async def catalogue_entry_details(
+    body: m.AssetBatchRequest,
+) -> m.AssetBatchResponse:
+    """The details of up to 100 assets at once, each as `/catalogue/{asset_id}` gives
+    it, or an error if there's no such asset"""
+    assets = await asset_db.details(body.ids)
+    results = []
+    for asset_id in body.ids:
+        asset = assets.get(str(asset_id))
+        if asset is None:
+            results.append({"id": asset_id, "error": "Item not found"})
+        elif asset["type"] == m.assetType.dataset:
+            results.append(
+                {"id": asset_id, "asset": m.DatasetResponse.model_validate(asset)}
+            )
+        elif asset["type"] == m.assetType.service:
+            results.append(
+                {"id": asset_id, "asset": m.DataServiceResponse.model_validate(asset)}
+            )
+        else:
+            results.append({"id": asset_id, "error": "Item not found"})
+    return {"results": results}
+
+
 @app.get("/catalogue/{asset_id}", tags=["data"])
-async def catalogue_entry_detail(asset_id: UUID) -> m.AssetDetailResponse:
-    asset = asset_db.detail(asset_id)
+async def catalogue_entry_detail(
+    asset_id: UUID, request: Request, response: Response
+) -> m.AssetDetailResponse:
+    version = await asset_db.asset_version(asset_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+    tag = conditional.etag(str(asset_id), version)
+    last_modified = version["catalogueModified"]
+    if cached := conditional.not_modified(
+        request, response, "asset", tag, last_modified
+    ):
+        return cached
+
+    if config.READ_MODEL:
+        if document := await read_model.detail_document(asset_id, version["links"]):
+            return Response(
+                '{"asset":' + document + "}",
+                media_type="application/json",
+                headers=response.headers,
+            )
+
+    asset = await asset_db.detail(asset_id)
     if asset["type"] == m.assetType.dataset:
         asset = m.DatasetResponse.model_validate(asset)
     elif asset["type"] == m.assetType.service:
@@ -79,15 +270,15 @@ async def login(jwt: Annotated[JWTBearer(), Depends()]):
 
     user_id = utils.user_id_from_email(user_email)
 
-    local_user = user_db.get_by_id(user_id)
+    local_user = await user_db.get_by_id(user_id)
 
     if not local_user:
-        new_user = user_db.new_user(user_id, user_email)
+        new_user = await user_db.new_user(user_id, user_email)
         return m.LoginResponse.model_validate(
             {"user": new_user, "new_user": True, "sharedata": {}}
         )
 
-    share_request_forms = share_db.get_sharedata(user_id)
+    share_request_forms = await share_db.get_sharedata(user_id)
     return m.LoginResponse.model_validate(
         {"user": local_user, "new_user": False, "sharedata": share_request_forms}
     )
@@ -98,7 +289,7 @@ async def upsert_sharedata(
     jwt: Annotated[JWTBearer(), Depends()], req: m.UpsertShareDataRequest
 ):
     user_id = utils.user_id_from_email(jwt.get("email"))
-    res = share_db.upsert_sharedata(user_id, req.sharedata)
+    res = await share_db.upsert_sharedata(user_id, req.sharedata)
     return res
 
 
@@ -106,7 +297,7 @@ async def upsert_sharedata(
 async def asset_counts(
     user: Annotated[m.RegisteredUser, Depends(authenticated_user)]
 ) -> m.AssetCountsResponse:
-    results_dicts = asset_db.counts_by_org(user.org.slug)
+    results_dicts = await asset_db.counts_by_org(user.org.slug)
 
     counts = {"Dataset": 0, "DataService": 0}
     for asset_type in counts.keys():
@@ -123,7 +314,12 @@ async def publish_assets(
     body: pubres.CreateAssetsRequestBody,
 ) -> pubres.CreateAssetsResponseBody:
     data = body.dict()["data"]
-    return pubres.CreateAssetsResponseBody.model_validate(publish.create_assets(data))
+    # Validating and generating triples is synchronous, so take the snapshot of
+    # reference data they use here rather than loading it on the event loop
+    reference = await reference_data.reference_data_validator.current()
+    return pubres.CreateAssetsResponseBody.model_validate(
+        await publish.create_assets(data, reference)
+    )
 
 
 # multipart/form-data endpoint
@@ -141,7 +337,8 @@ async def prepare_batch_publish_request(
         ),
     ],
 ) -> pubres.ParseFilesResponseBody:
+    reference = await reference_data.reference_data_validator.current()
     parsed = pubcsv.parse_input_files(
-        datasets_file=datasets.file, services_file=dataservices.file
+        reference, datasets_file=datasets.file, services_file=dataservices.file
     )
     return pubres.format_response(parsed)
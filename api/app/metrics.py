@@ -0,0 +1,206 @@
+"""Minimal Prometheus-style metrics, rendered in the text exposition format at /metrics.
+
+Only what the API needs: labelled counters and histograms, and a rolling log of the
+slowest SPARQL queries. Every update takes a lock for a handful of dict operations,
+so recording is cheap enough to do on every query and request."""
+import heapq
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Tuple
+
+from app import config
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, description: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels[n] for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(labels[n] for n in self.labelnames), 0)
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} counter",
+        ]
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DURATION_BUCKETS,
+    ):
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # For each label set: [count per bucket (+Inf last), sum]
+        self._values: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels[n] for n in self.labelnames)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0]
+            entry[0][i] += 1
+            entry[1] += value
+
+    def count(self, **labels) -> int:
+        """The number of observations with the given labels (any value for labels
+        that aren't given)"""
+        with self._lock:
+            return sum(
+                sum(counts)
+                for key, (counts, _) in self._values.items()
+                if all(key[self.labelnames.index(n)] == v for n, v in labels.items())
+            )
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            values = [
+                (k, list(counts), total) for k, (counts, total) in self._values.items()
+            ]
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [("le", bound)])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class SlowQueryLog:
+    """Keeps the `size` slowest queries seen within the last `window` seconds"""
+
+    def __init__(self, size: int, window: float):
+        self.size = size
+        self.window = window
+        self._heap = []
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        live = [e for e in self._heap if now - e[1] <= self.window]
+        if len(live) != len(self._heap):
+            heapq.heapify(live)
+            self._heap = live
+
+    def record(self, duration: float, query: str, graph: str, rows: int | None):
+        now = time.time()
+        entry = (duration, now, query, graph, rows)
+        with self._lock:
+            self._expire(now)
+            if len(self._heap) < self.size:
+                heapq.heappush(self._heap, entry)
+            elif duration > self._heap[0][0]:
+                heapq.heapreplace(self._heap, entry)
+
+    def entries(self) -> List[dict]:
+        with self._lock:
+            self._expire(time.time())
+            heap = sorted(self._heap, reverse=True)
+        return [
+            {
+                "query": query,
+                "graph": graph,
+                "durationSeconds": round(duration, 6),
+                "rows": rows,
+                "at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(at)),
+            }
+            for duration, at, query, graph, rows in heap
+        ]
+
+
+sparql_duration = Histogram(
+    "sparql_query_duration_seconds",
+    "Time taken to run a SPARQL query or update and read its response",
+    ("query", "graph", "kind"),
+)
+sparql_rows = Histogram(
+    "sparql_query_result_rows",
+    "Number of result rows returned by a SPARQL query",
+    ("query", "graph"),
+    buckets=ROW_BUCKETS,
+)
+sparql_response_bytes = Counter(
+    "sparql_response_bytes_total",
+    "Bytes read from SPARQL responses",
+    ("query", "graph"),
+)
+sparql_errors = Counter(
+    "sparql_errors_total",
+    "SPARQL queries or updates that failed",
+    ("query", "graph", "kind"),
+)
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Time taken to handle an API request",
+    ("method", "route", "status"),
+)
+export_assets_skipped = Counter(
+    "export_assets_skipped_total",
+    "Assets left out of a catalogue export because they aren't valid",
+)
+export_failures = Counter(
+    "export_failures_total",
+    "Catalogue exports cut short by an error after the response had started",
+)
+slow_queries = SlowQueryLog(config.SLOW_QUERY_LOG_SIZE, config.SLOW_QUERY_WINDOW)
+
+registry = [
+    sparql_duration,
+    sparql_rows,
+    sparql_response_bytes,
+    sparql_errors,
+    http_request_duration,
+    export_assets_skipped,
+    export_failures,
+]
+
+
+def render() -> str:
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -58,6 +58,28 @@ class Organisation(BaseModel):
     }
 
 
+class Theme(BaseModel):
+    label: str = Field(description="The theme as assets and /catalogue?topic= give it")
+    uri: str = Field(
+        description="The theme as the `theme` column of a CSV upload takes it"
+    )
+
+
+class MediaType(BaseModel):
+    label: str = Field(
+        description="A value the `mediaType` column of a CSV upload takes, e.g. CSV or text/csv"
+    )
+    uri: str
+
+
+class UpdateFrequency(BaseModel):
+    notation: str = Field(
+        description="The value the `updateFrequency` column of a CSV upload takes, e.g. freq:monthly"
+    )
+    label: str | None = None
+    uri: str
+
+
 class ServiceStatus(str, Enum):
     discovery = "DISCOVERY"
     alpha = "ALPHA"
@@ -84,6 +106,7 @@ class ServiceType(str, Enum):
 class SearchFacet(BaseModel):
     title: str
     id: str
+    count: int = Field(description="The number of matching assets with this value")
 
 
 class SearchFacets(BaseModel):
@@ -315,6 +338,10 @@ class DataServiceResponse(DataService, OutputAssetInfo):
 # For the list endpoint, which returns only a summary of each asset
 class DatasetSummary(BaseAssetSummary, OutputAssetInfo):
     type: Literal[assetType.dataset]
+    relevance: float | None = Field(
+        None,
+        description="How well the asset matches the search query, higher is better. Only set when searching for words",
+    )
     mediaType: List[str]
     title: str
     model_config = {
@@ -357,6 +384,10 @@ class DatasetSummary(BaseAssetSummary, OutputAssetInfo):
 
 class DataServiceSummary(BaseAssetSummary, OutputAssetInfo):
     type: Literal[assetType.service]
+    relevance: float | None = Field(
+        None,
+        description="How well the asset matches the search query, higher is better. Only set when searching for words",
+    )
     serviceType: ServiceType
     title: str
 
@@ -398,8 +429,29 @@ class DataServiceSummary(BaseAssetSummary, OutputAssetInfo):
     }
 
 
+class suggestionType(str, Enum):
+    asset = "asset"
+    keyword = "keyword"
+    topic = "topic"
+    organisation = "organisation"
+
+
+class Suggestion(BaseModel):
+    text: str
+    type: suggestionType
+    id: str | None = Field(
+        None,
+        description="The asset's identifier, or the value to filter /catalogue by for a topic or organisation",
+    )
+
+
 class SearchAssetsResponse(BaseModel):
     data: List[DatasetSummary | DataServiceSummary]
+    total: int = Field(description="The number of matching assets across all pages")
+    nextCursor: str | None = Field(
+        None,
+        description="Pass as `cursor` to get the next page. Not set on the last page",
+    )
     facets: SearchFacets
 
 
@@ -407,6 +459,27 @@ class AssetDetailResponse(BaseModel):
     asset: DatasetResponse | DataServiceResponse
 
 
+ASSET_BATCH_MAX = 100
+
+
+class AssetBatchRequest(BaseModel):
+    ids: conlist(uuid.UUID, min_length=1, max_length=ASSET_BATCH_MAX)
+
+
+class AssetBatchItem(BaseModel):
+    id: uuid.UUID
+    asset: DatasetResponse | DataServiceResponse | None = None
+    error: str | None = Field(
+        None, description="Why the asset isn't given, e.g. there's no such asset"
+    )
+
+
+class AssetBatchResponse(BaseModel):
+    results: List[AssetBatchItem] = Field(
+        description="One for each requested ID, in the same order"
+    )
+
+
 class CreateAssetBody(BaseAsset):
     organisationID: str
     creatorID: conlist(str, min_length=1)
@@ -0,0 +1,196 @@
+"""The registry of government organisations that assets and users belong to, from the
+GOV.UK organisations API.
+
+The API boots from a snapshot on disk: the one saved by the last refresh
+(ORGANISATIONS_SNAPSHOT), or the one bundled in data/organisations.json when the
+Docker image is built, whichever is newer. Only if there's neither does startup
+wait for GOV.UK, and it fails if that can't be reached. Once the snapshot is
+ORGANISATIONS_REFRESH seconds old, a background task fetches the API's pages
+concurrently, swaps the new snapshot in with a single assignment and saves it for
+the next start.
+
+For tests, ORGANISATIONS_FIXTURE names a snapshot file to use as it is; GOV.UK is
+never fetched. Make a snapshot with `python -m app.organisations <file>`."""
+import asyncio
+import json
+import os
+import sys
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from types import MappingProxyType
+
+import requests
+
+from app import config
+from app import model as m
+
+# Outside app/ so that it isn't hidden when the app is mounted into the container
+BUNDLED_SNAPSHOT = Path(__file__).parent.parent / "data" / "organisations.json"
+
+# The most pages of the GOV.UK API fetched at once
+FETCH_CONCURRENCY = 8
+
+Snapshot = namedtuple("Snapshot", ["fetched", "organisations"])
+
+
+def _parse(org_results):
+    return [
+        {
+            "id": o["id"],
+            "title": o["title"],
+            "abbreviation": o["details"]["abbreviation"],
+            "slug": o["details"]["slug"],
+            "format": o["format"],
+            "web_url": o["web_url"],
+        }
+        for o in org_results
+    ]
+
+
+def _snapshot(fetched: datetime, organisations) -> Snapshot:
+    return Snapshot(
+        fetched,
+        MappingProxyType(
+            {o["slug"]: m.Organisation.model_validate(o) for o in organisations}
+        ),
+    )
+
+
+def fetch() -> Snapshot:
+    """Fetch every page of the GOV.UK organisations API: the first, to find out how
+    many there are, then the rest concurrently"""
+
+    def page(n):
+        response = requests.get(
+            config.ORGANISATIONS_URL,
+            params={"page": n},
+            timeout=config.ORGANISATIONS_FETCH_TIMEOUT,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    fetched = datetime.now(timezone.utc)
+    first = page(1)
+    pages = [first]
+    with ThreadPoolExecutor(FETCH_CONCURRENCY) as executor:
+        pages += executor.map(page, range(2, first.get("pages", 1) + 1))
+    return _snapshot(fetched, [o for p in pages for o in _parse(p["results"])])
+
+
+def read(path) -> Snapshot | None:
+    """The snapshot saved in the file, or None if there isn't one"""
+    try:
+        with open(path) as f:
+            saved = json.load(f)
+    except FileNotFoundError:
+        return None
+    return _snapshot(datetime.fromisoformat(saved["fetched"]), saved["organisations"])
+
+
+def save(snapshot: Snapshot, path):
+    """Save the snapshot so that it can't be read half-written"""
+    saved = {
+        "fetched": snapshot.fetched.isoformat(),
+        "organisations": [
+            o.model_dump(mode="json") for o in snapshot.organisations.values()
+        ],
+    }
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    partial = f"{path}.{os.getpid()}"
+    with open(partial, "w") as f:
+        json.dump(saved, f, indent=1)
+    os.replace(partial, path)
+
+
+class OrganisationRegistry:
+    def __init__(self):
+        self._snapshot = None
+        self._loading = threading.Lock()
+
+    def _boot(self) -> Snapshot:
+        if config.ORGANISATIONS_FIXTURE:
+            if fixture := read(config.ORGANISATIONS_FIXTURE):
+                return fixture
+            raise FileNotFoundError(config.ORGANISATIONS_FIXTURE)
+        snapshots = []
+        for path in (config.ORGANISATIONS_SNAPSHOT, BUNDLED_SNAPSHOT):
+            try:
+                if snapshot := read(path):
+                    snapshots.append(snapshot)
+            except Exception as e:
+                print(f"Couldn't read the organisations snapshot {path}: {e}")
+        if snapshots:
+            return max(snapshots, key=lambda s: s.fetched)
+        try:
+            return self._fetch_and_save()
+        except Exception as e:
+            raise RuntimeError(
+                f"There's no organisations snapshot and GOV.UK couldn't be reached: {e}"
+            ) from e
+
+    @property
+    def snapshot(self) -> Snapshot:
+        """The current snapshot. The first use loads it, once, however many threads
+        ask for it. Raises RuntimeError if there's none to load."""
+        current = self._snapshot
+        if current is not None:
+            return current
+        with self._loading:
+            if self._snapshot is None:
+                self._snapshot = self._boot()
+            return self._snapshot
+
+    def _fetch_and_save(self) -> Snapshot:
+        snapshot = fetch()
+        try:
+            save(snapshot, config.ORGANISATIONS_SNAPSHOT)
+        except OSError as e:
+            print(f"Couldn't save the organisations snapshot: {e}")
+        return snapshot
+
+    async def load(self):
+        """Load the snapshot without blocking the event loop"""
+        await asyncio.to_thread(lambda: self.snapshot)
+
+    def seconds_until_refresh(self) -> float:
+        age = datetime.now(timezone.utc) - self.snapshot.fetched
+        return max(0, config.ORGANISATIONS_REFRESH - age.total_seconds())
+
+    async def refresh(self):
+        """Fetch a new snapshot and swap it in"""
+        self._snapshot = await asyncio.to_thread(self._fetch_and_save)
+
+    def lookup(self, slug: str) -> m.Organisation:
+        try:
+            return self.snapshot.organisations[slug]
+        except KeyError:
+            raise ValueError(f'Organisation "{slug}" does not exist')
+
+    def __contains__(self, slug: str):
+        return slug in self.snapshot.organisations
+
+
+registry = OrganisationRegistry()
+
+
+async def maintain():
+    """Refresh the registry whenever it's ORGANISATIONS_REFRESH seconds old"""
+    if config.ORGANISATIONS_FIXTURE:
+        return
+    while True:
+        delay = registry.seconds_until_refresh()
+        if delay == 0:
+            try:
+                await registry.refresh()
+                delay = config.ORGANISATIONS_REFRESH
+            except Exception as e:
+                print(f"Failed to refresh the organisations: {e}")
+                delay = min(600, config.ORGANISATIONS_REFRESH)
+        await asyncio.sleep(max(delay, 60))
+
+
+if __name__ == "__main__":
+    save(fetch(), sys.argv[1] if len(sys.argv) > 1 else BUNDLED_SNAPSHOT)
@@ -5,13 +5,17 @@ from app.db.model import (
     subject_uri,
     distribution_uri,
 )
+from app.db.reference_data import ReferenceData
 from app.db.sparql import assets_db
+from app.db import asset as asset_db, suggest
 from typing import List
-from app import utils
+from app import config, utils
 from datetime import datetime
 import uuid
 from app.publish.errors import errorScope
 
+assets_db.require({"create_asset": ["triples"]})
+
 
 def _add_organisations(asset):
     creators = [
@@ -41,14 +45,20 @@ def _create_asset(asset):
     return asset
 
 
-def create_assets(assets: List[m.CreateDatasetBody | m.CreateDataServiceBody]):
+async def create_assets(
+    assets: List[m.CreateDatasetBody | m.CreateDataServiceBody],
+    reference: ReferenceData,
+):
+    """Store the assets, with their vocabularies checked against the one snapshot
+    of reference data for all of them"""
+    version = reference.version
     assets = [_add_organisations(a) for a in assets]
     assets = [_create_asset(a) for a in assets]
     triples = []
     errors = []
     for a in assets:
         try:
-            triples = triples + asset_to_triples(a)
+            triples = triples + asset_to_triples(a, reference)
         except Exception as e:
             errors.append(
                 {
@@ -59,11 +69,10 @@ def create_assets(assets: List[m.CreateDatasetBody | m.CreateDataServiceBody]):
                 }
             )
     if errors != []:
-        return {"errors": errors, "data": []}
+        return {"errors": errors, "data": [], "referenceDataVersion": version}
     try:
         sparql = triples_to_sparql(triples)
-        response = assets_db.run_update("create_asset", triples=sparql)
-        return {"errors": [], "data": assets}
+        response = await assets_db.run_update("create_asset", triples=sparql)
     except Exception as e:
         return {
             "errors": [
@@ -75,4 +84,18 @@ def create_assets(assets: List[m.CreateDatasetBody | m.CreateDataServiceBody]):
                 }
             ],
             "data": [],
+            "referenceDataVersion": version,
         }
+    try:
+        await asset_db.index_assets([str(a["resourceUri"]) for a in assets])
+    except Exception as e:
+        # The assets are saved; they'll be in the search index after its next rebuild
+        print(f"Failed to add published assets to the search index: {e}")
+    if config.READ_MODEL:
+        try:
+            await asset_db.store_documents([str(a["resourceUri"]) for a in assets])
+        except Exception as e:
+            # Reads of these assets fall back to their triples until a rebuild
+            print(f"Failed to store read model documents: {e}")
+    suggest.refresh_after_publish()
+    return {"errors": [], "data": assets, "referenceDataVersion": version}
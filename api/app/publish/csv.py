@@ -14,7 +14,7 @@ from app.publish.errors import (
     errorScope,
     dicts_diff,
 )
-from app.db.reference_data import reference_data_validator
+from app.db.reference_data import ReferenceData
 
 
 expected_headers = {
@@ -220,7 +220,7 @@ def _validation_error(lookup_fn, value):
         return str(e)
 
 
-def _validate_db_fields(asset):
+def _validate_db_fields(asset, reference: ReferenceData):
     """Check that all fields referencing other entities in the database refer to one that exists,
     and return a list of errors for those that dont"""
     errors = []
@@ -248,7 +248,7 @@ def _validate_db_fields(asset):
     if asset["type"] == m.assetType.dataset:
         for dist in asset.get("distributions", []):
             if err := _validation_error(
-                reference_data_validator.media_type_uri, dist.get("mediaType", None)
+                reference.media_type_uri, dist.get("mediaType", None)
             ):
                 errors.append(
                     db_validation_error_info(
@@ -259,7 +259,7 @@ def _validate_db_fields(asset):
                     )
                 )
         if err := _validation_error(
-            reference_data_validator.update_freq_url, asset.get("updateFrequency", None)
+            reference.update_freq_url, asset.get("updateFrequency", None)
         ):
             errors.append(
                 db_validation_error_info(
@@ -270,13 +270,16 @@ def _validate_db_fields(asset):
                 )
             )
     for t in asset.get("theme", []):
-        if err := _validation_error(reference_data_validator.theme_uri, t):
+        if err := _validation_error(reference.theme_uri, t):
             errors.append(db_validation_error_info("theme", t, err))
     return errors
 
 
 def parse_input_file(
-    error_ctx: ErrorContainer, csv_file: SpooledTemporaryFile, asset_type: m.assetType
+    error_ctx: ErrorContainer,
+    csv_file: SpooledTemporaryFile,
+    asset_type: m.assetType,
+    reference: ReferenceData,
 ):
     rows, error = _to_row_dicts(csv_file, asset_type)
     error_ctx.add(error)
@@ -294,7 +297,7 @@ def parse_input_file(
     )
     validated_data = []
     for d in data:
-        validation_errors = _validate_db_fields(d)
+        validation_errors = _validate_db_fields(d, reference)
         try:
             validated = model.model_validate(d)
         except ValidationError as e:
@@ -318,19 +321,22 @@ def parse_input_file(
     return validated_data
 
 
-def parse_input_files(datasets_file=None, services_file=None):
+def parse_input_files(reference: ReferenceData, datasets_file=None, services_file=None):
+    """Parse and validate the files, checking the vocabularies against the one
+    snapshot of reference data for all of them"""
     error_container = ErrorContainer()
     parsed_datasets = (
-        parse_input_file(error_container, datasets_file, m.assetType.dataset)
+        parse_input_file(error_container, datasets_file, m.assetType.dataset, reference)
         if datasets_file is not None
         else []
     )
     parsed_services = (
-        parse_input_file(error_container, services_file, m.assetType.service)
+        parse_input_file(error_container, services_file, m.assetType.service, reference)
         if services_file is not None
         else []
     )
     return {
         "errors": error_container.errors(),
         "data": parsed_datasets + parsed_services,
+        "referenceDataVersion": reference.version,
     }
@@ -8,6 +8,8 @@ import app.publish.errors as err
 
 class PostResponseBody(BaseModel):
     errors: List[err.ErrorInfo]
+    # The version of the reference data the assets were validated against
+    referenceDataVersion: str | None = None
 
     def ok(self):
         return self.errors != []
@@ -34,5 +36,6 @@ def format_response(response_dict):
         {
             "errors": errors,
             "data": data,
+            "referenceDataVersion": response_dict.get("referenceDataVersion"),
         }
     )
@@ -0,0 +1,16 @@
+"""Regenerate the read model documents of every asset from the triples.
+
+    python -m app.rebuild_read_model
+"""
+import asyncio
+
+from app.db import asset as asset_db
+
+
+def main():
+    stored = asyncio.run(asset_db.rebuild_documents())
+    print(f"Stored documents for {stored} assets")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,13 @@
 import datetime
+from functools import partial
 
 from typing import Annotated, List
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 
 from app import utils
 from app import model as m
 from app.db import share as share_db
+from app.db.cursor import InvalidCursor
 from app.auth.jwt_bearer import authenticated_user
 from app.db.utils import wrap_markdown
 
@@ -36,11 +38,32 @@ def enrich_share_request(r: dict, org: m.Organisation = None) -> dict:
     return r
 
 
+async def _paged(request: Request, response: Response, fetch):
+    """Run `fetch`, a share_db list function partially applied to its limit and cursor,
+    and link to the next page from the response's Link header"""
+    try:
+        results, next_cursor = await fetch()
+    except InvalidCursor as e:
+        raise HTTPException(400, str(e))
+    if next_cursor:
+        next_url = request.url.include_query_params(cursor=next_cursor)
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return results
+
+
 @router.get("/created-requests")
 async def created_requests(
-    user: Annotated[m.RegisteredUser, Depends(authenticated_user)]
+    user: Annotated[m.RegisteredUser, Depends(authenticated_user)],
+    request: Request,
+    response: Response,
+    limit: Annotated[int | None, Query(ge=1, le=1000)] = None,
+    cursor: str = None,
 ) -> List[m.ShareRequest]:
-    share_requests = share_db.created_requests(user.id)
+    share_requests = await _paged(
+        request,
+        response,
+        partial(share_db.created_requests, user.id, limit=limit, cursor=cursor),
+    )
     for s in share_requests:
         s["requesterId"] = user.id
     share_requests = [enrich_share_request(s) for s in share_requests]
@@ -49,12 +72,20 @@ async def created_requests(
 
 @router.get("/received-requests")
 async def received_requests(
-    user: Annotated[m.RegisteredUser, Depends(authenticated_user)]
+    user: Annotated[m.RegisteredUser, Depends(authenticated_user)],
+    request: Request,
+    response: Response,
+    limit: Annotated[int | None, Query(ge=1, le=1000)] = None,
+    cursor: str = None,
 ) -> List[m.ShareRequest]:
     org = user.org
     if not org:
         return []
-    share_requests = share_db.received_requests(org.slug)
+    share_requests = await _paged(
+        request,
+        response,
+        partial(share_db.received_requests, org.slug, limit=limit, cursor=cursor),
+    )
     result = [
         m.ShareRequest.model_validate(enrich_share_request(r, org))
         for r in share_requests
@@ -66,7 +97,7 @@ async def received_requests(
 async def received_request(
     request_id: str, user: Annotated[m.RegisteredUser, Depends(authenticated_user)]
 ) -> m.ShareRequest | m.ShareRequestWithExtras:
-    share_request = share_db.received_request(request_id)
+    share_request = await share_db.received_request(request_id)
     if not share_request:
         raise HTTPException(404, f"Request {request_id} not found.")
 
@@ -90,7 +121,7 @@ async def review_request(
     body: m.ReviewRequest,
     user: Annotated[m.RegisteredUser, Depends(authenticated_user)],
 ) -> m.SPARQLUpdate:
-    share_request = share_db.received_request(request_id)
+    share_request = await share_db.received_request(request_id)
     if not share_request:
         raise HTTPException(404, f"Request {request_id} not found.")
 
@@ -102,7 +133,7 @@ async def review_request(
 
     reviewNotes = wrap_markdown(body.notes)
 
-    result = share_db.upsert_request_notes(request_id, reviewNotes)
+    result = await share_db.upsert_request_notes(request_id, reviewNotes)
 
     return m.SPARQLUpdate.model_validate(result)
 
@@ -113,7 +144,7 @@ async def request_decision(
     body: m.DecisionRequest,
     user: Annotated[m.RegisteredUser, Depends(authenticated_user)],
 ) -> m.SPARQLUpdate:
-    share_request = share_db.received_request(request_id)
+    share_request = await share_db.received_request(request_id)
     if not share_request:
         raise HTTPException(404, f"Request {request_id} not found.")
 
@@ -125,7 +156,7 @@ async def request_decision(
 
     decisionNotes = wrap_markdown(body.decisionNotes)
 
-    result = share_db.upsert_decision(
+    result = await share_db.upsert_decision(
         request_id, status=body.status, decisionNotes=decisionNotes
     )
     return m.SPARQLUpdate.model_validate(result)
@@ -1,6 +1,6 @@
 from typing import Annotated, List, Literal
 from fastapi import APIRouter, Depends, HTTPException, Path
-from app import utils
+from app import utils, organisations
 from app import model as m
 from app.db import user as user_db, asset as asset_db
 from app.auth.jwt_bearer import JWTBearer, authenticated_user, any_type_of_user
@@ -16,7 +16,7 @@ async def list_users(
 ) -> List[m.RegisteredUser]:
     if not is_ops:
         raise HTTPException(status_code=401, detail="Unauthorised")
-    users = user_db.list_users()
+    users = await user_db.list_users()
     return users
 
 
@@ -24,7 +24,7 @@ async def list_users(
 async def show_self(
     user: Annotated[m.RegisteredUser, Depends(authenticated_user)]
 ) -> m.RegisteredUser:
-    return user_db.get_by_id(user.id)
+    return await user_db.get_by_id(user.id)
 
 
 @router.get(
@@ -56,7 +56,7 @@ async def check_permission(
                     status_code=400, detail=f"Invalid action for asset: {action}"
                 )
             try:
-                asset = asset_db.detail(target_id)
+                asset = await asset_db.detail(target_id)
             except:
                 raise HTTPException(
                     status_code=404, detail=f"Asset not found for ID {target_id}"
@@ -89,14 +89,14 @@ async def complete_profile(
     if user.org:
         raise HTTPException(400, "Organisation already set")
 
-    if profile.organisation not in utils.orgs.keys():
+    if profile.organisation not in organisations.registry:
         raise HTTPException(
             status_code=400, detail=f"Invalid organisation: {profile.organisation}"
         )
 
-    user_db.complete_profile(user.id, profile.organisation, profile.jobTitle)
+    await user_db.complete_profile(user.id, profile.organisation, profile.jobTitle)
 
-    return user_db.get_by_id(user.id)
+    return await user_db.get_by_id(user.id)
 
 
 @router.get("/{user_id}")
@@ -111,13 +111,13 @@ async def show_user(
 
     # If you've passed the OPS_KEY, return the user
     if is_ops:
-        return user_db.get_by_id(user_id)
+        return await user_db.get_by_id(user_id)
 
     # If you're not OPS, you need to have sent a JWT and can only see yourself
     if jwt is not None:
         authed_user_id = utils.user_id_from_email(jwt.get("email"))
         if authed_user_id == user_id:
-            return user_db.get_by_id(authed_user_id)
+            return await user_db.get_by_id(authed_user_id)
 
     raise HTTPException(401, "Unauthorised")
 
@@ -133,7 +133,7 @@ async def delete_user(
     if "@" in user_id:
         user_id = utils.user_id_from_email(user_id)
 
-    return user_db.delete_by_id(user_id)
+    return await user_db.delete_by_id(user_id)
 
 
 @router.put(
@@ -150,14 +150,14 @@ async def edit_user_org(
     if "@" in user_id:
         user_id = utils.user_id_from_email(user_id)
 
-    user = user_db.get_by_id(user_id)
+    user = await user_db.get_by_id(user_id)
     if not user:
         raise HTTPException(status_code=400, detail=f"Invalid user id: {user_id}")
 
-    if req.org not in utils.orgs.keys():
+    if req.org not in organisations.registry:
         raise HTTPException(status_code=400, detail=f"Invalid organisation: {req.org}")
 
-    return m.SPARQLUpdate.model_validate(user_db.edit_org(user_id, req.org))
+    return m.SPARQLUpdate.model_validate(await user_db.edit_org(user_id, req.org))
 
 
 @router.put("/{user_id}/permissions", summary="Add or remove permissions from a user")
@@ -173,9 +173,9 @@ async def edit_user_permissions(
     if "@" in user_id:
         user_id = utils.user_id_from_email(user_id)
 
-    user = user_db.get_by_id(user_id)
+    user = await user_db.get_by_id(user_id)
     if not user:
         raise HTTPException(status_code=400, detail=f"Invalid user id: {user_id}")
     return m.SPARQLUpdate.model_validate(
-        user_db.edit_permissions(user_id, req.add, req.remove)
+        await user_db.edit_permissions(user_id, req.add, req.remove)
     )
@@ -2,10 +2,9 @@ from datetime import datetime
 import hashlib
 import json
 
-import requests
-
 from . import model as m
 from . import config
+from . import organisations
 
 MVP_ORGS = [
     "attorney-generals-office",
@@ -56,41 +55,8 @@ MVP_ORGS = [
 ]
 
 
-def initialise_organisations():
-    def parse_orgs(org_results):
-        return {
-            o["details"]["slug"]: {
-                "id": o["id"],
-                "title": o["title"],
-                "abbreviation": o["details"]["abbreviation"],
-                "slug": o["details"]["slug"],
-                "format": o["format"],
-                "web_url": o["web_url"],
-            }
-            for o in org_results
-        }
-
-    response = requests.get("https://www.gov.uk/api/organisations").json()
-    orgs = parse_orgs(response["results"])
-    while response.get("next_page_url", None):
-        response = requests.get(response["next_page_url"]).json()
-        orgs = {**orgs, **parse_orgs(response["results"])}
-    return orgs
-
-
-orgs = initialise_organisations()
-
-
 def lookup_organisation(org_id: str) -> m.Organisation:
-    try:
-        org_data = orgs[org_id]
-    except:
-        raise ValueError(f'Organisation "{org_id}" does not exist')
-    return m.Organisation.model_validate(org_data)
-
-
-def sanitise_search_query(q: str):
-    return q.strip('"')
+    return organisations.registry.lookup(org_id)
 
 
 def select_keys(d: dict, keys: list):
@@ -0,0 +1,132 @@
+"""Compare catalogue search latency with the old FILTER (STR(...) = ...) filters
+against the VALUES filters, on a catalogue seeded with many organisations.
+
+Needs a running triplestore (e.g. `docker compose up fuseki`). The script adds
+--assets synthetic assets, spread over --organisations publishers, to the assets
+graph, times the search count query with each kind of filter, then deletes the
+assets it added.
+
+Run from the api directory:
+    cd api && TRIPLESTORE_URL=http://localhost:3030 DATASET_NAME=ds \\
+        PYTHONPATH=. python ../dev/bench_filters.py --assets 5000 --organisations 400
+"""
+import argparse
+import random
+import statistics
+import time
+
+from app import model as m
+from app.db import asset
+from app.db.cache import QueryCache
+from app.db.sparql import Connection
+from app import config
+
+BENCH_ASSET = "http://marketplace.cddo.gov.uk/asset/bench-"
+THEMES = ["Mapping", "Defence", "Transport", "Health", "Environment", "Education"]
+
+PREFIXES = """
+PREFIX dcat: <http://www.w3.org/ns/dcat#>
+PREFIX dct: <http://purl.org/dc/terms/>
+PREFIX cddo_asset: <http://marketplace.cddo.gov.uk/asset/>
+PREFIX cddo_graph: <http://marketplace.cddo.gov.uk/graph/>
+PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
+"""
+
+
+def theme_uri(label):
+    return f"<https://www.data.gov.uk/search?filters%5Btopic%5D={label}>"
+
+
+def seed(db, n_assets, n_orgs, batch=500):
+    for start in range(0, n_assets, batch):
+        triples = []
+        for i in range(start, min(start + batch, n_assets)):
+            s = f"<{BENCH_ASSET}{i}>"
+            kind = "dcat:Dataset" if i % 3 else "dcat:DataService"
+            triples += [
+                f'{s} a {kind} ; dct:identifier "bench-{i}" ;',
+                f'  dct:title "Benchmark asset {i}" ;',
+                '  dct:description "Synthetic asset for benchmarking" ;',
+                f'  dct:publisher "bench-org-{i % n_orgs}" ;',
+                f"  dcat:theme {theme_uri(THEMES[i % len(THEMES)])} ;",
+                '  cddo_asset:created "2023-01-01"^^xsd:date ;',
+                '  cddo_asset:modified "2023-01-01"^^xsd:date .',
+            ]
+        update = PREFIXES + (
+            "INSERT DATA { GRAPH cddo_graph:assets {\n" + "\n".join(triples) + "\n} }"
+        )
+        db.session.post(db.update_url, data={"update": update}).raise_for_status()
+
+
+def clean_up(db):
+    update = PREFIXES + (
+        "DELETE { GRAPH cddo_graph:assets { ?s ?p ?o } }\n"
+        "WHERE { GRAPH cddo_graph:assets { ?s ?p ?o "
+        f'FILTER STRSTARTS(STR(?s), "{BENCH_ASSET}") }} }}'
+    )
+    db.session.post(db.update_url, data={"update": update}).raise_for_status()
+
+
+def str_filter(organisations, themes):
+    """How the filters used to be built"""
+    groups = [("?organisation", organisations), ("?theme", themes)]
+    ors = [
+        "(" + " || ".join(f'STR({p}) = "{v}"' for v in vals) + ")"
+        for p, vals in groups
+        if vals
+    ]
+    theme_pattern = (
+        "OPTIONAL {{ ?resourceUri dcat:theme ?themeURI } "
+        "{ ?themeURI skos:prefLabel ?theme }} .\n    "
+    )
+    return theme_pattern + f"FILTER ({' && '.join(ors)})"
+
+
+def timed(db, filters, repeats):
+    durations = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        total = db.run_query_sync("asset_search_count", q="*", filters=filters)
+        durations.append(time.perf_counter() - started)
+    return statistics.median(durations), int(total[0]["total"])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--assets", type=int, default=5000)
+    parser.add_argument("--organisations", type=int, default=400)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    db = Connection(
+        query_url=config.QUERY_URL,
+        update_url=config.UPDATE_URL,
+        query_template_dir="queries",
+        cache=QueryCache(size=0, ttl=0, max_rows=1000),
+    )
+    seed(db, args.assets, args.organisations)
+    try:
+        orgs = [f"bench-org-{i}" for i in range(args.organisations)]
+        cases = [
+            ("1 organisation", orgs[:1], [], []),
+            ("20 organisations", random.sample(orgs, 20), [], []),
+            ("20 organisations, 2 themes", random.sample(orgs, 20), THEMES[:2], []),
+            ("all organisations", orgs, [], []),
+        ]
+        print(f"{'filter':<30} {'STR() FILTER':>14} {'VALUES':>10}  matches")
+        for label, organisations, themes, types in cases:
+            old, old_total = timed(db, str_filter(organisations, themes), args.repeats)
+            new, new_total = timed(
+                db, asset._construct_filter(organisations, themes, types), args.repeats
+            )
+            assert old_total == new_total, (label, old_total, new_total)
+            print(f"{label:<30} {old:13.3f}s {new:9.3f}s  {new_total}")
+        dataset_only = asset._construct_filter([], [], [m.assetType.dataset])
+        duration, total = timed(db, dataset_only, args.repeats)
+        print(f"{'asset type Dataset':<30} {'-':>14} {duration:9.3f}s  {total}")
+    finally:
+        clean_up(db)
+
+
+if __name__ == "__main__":
+    main()
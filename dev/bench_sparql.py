@@ -0,0 +1,259 @@
+"""Compare throughput of the old blocking SPARQLWrapper calls against the pooled
+async Connection, using a local stub triplestore that answers every query after
+a fixed delay.
+
+With --identical, checks instead that concurrent identical queries are coalesced,
+and exits non-zero if they aren't (the result cache is turned off so it doesn't
+hide the coalescing). The stub holds each response until the whole burst of
+queries has started, then:
+- a burst of identical queries from coroutines, then from threads, must send
+  exactly one query to the triplestore
+- when the first query stops reading early, or its results are over the cache's
+  max_rows, the others must run it themselves and get every row
+
+Run from the api directory:
+    cd api && PYTHONPATH=. python ../dev/bench_sparql.py --requests 200 --delay 0.02
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault("TRIPLESTORE_URL", "http://127.0.0.1:3999")
+os.environ.setdefault("DATASET_NAME", "ds")
+
+from SPARQLWrapper import SPARQLWrapper, JSON, POST  # noqa: E402
+from app.db.cache import QueryCache  # noqa: E402
+from app.db.sparql import Connection  # noqa: E402
+
+received = 0
+# How many rows the stub answers with, and, if set, an event it waits for before
+# answering
+result_rows = 0
+gate = None
+
+
+def result(n):
+    bindings = [{"n": {"type": "literal", "value": str(i)}} for i in range(n)]
+    return json.dumps({"head": {"vars": ["n"]}, "results": {"bindings": bindings}})
+
+
+def stub_triplestore(port, delay):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            global received
+            received += 1
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if gate is not None:
+                gate.wait()
+            time.sleep(delay)
+            body = result(result_rows).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/sparql-results+json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        # The default backlog of 5 resets connections in a burst of queries
+        request_queue_size = 1024
+
+    server = Server(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def blocking_baseline(url, n):
+    """What every endpoint used to do: a fresh SPARQLWrapper call inside the event loop"""
+
+    async def one():
+        sparql = SPARQLWrapper(url)
+        sparql.setReturnFormat(JSON)
+        sparql.method = POST
+        sparql.setQuery("SELECT * WHERE { ?s ?p ?o } LIMIT 1")
+        sparql.queryAndConvert()
+
+    await asyncio.gather(*[one() for _ in range(n)])
+
+
+async def pooled(url, n, pool_size):
+    db = Connection(
+        query_url=url,
+        query_template_dir="queries",
+        pool_size=pool_size,
+        cache=QueryCache(size=0, ttl=0, max_rows=1000),
+    )
+    # Distinct bindings so that the queries can't be coalesced
+    await asyncio.gather(
+        *[db.run_query("asset_counts_by_org", org=str(i)) for i in range(n)]
+    )
+
+
+# How long the stub holds the first query for the rest of a burst to start, and
+# how long a burst may take before it counts as hung
+START_TIME = 0.5
+TIMEOUT = 30
+
+failures = []
+
+
+def check(ok, message):
+    print(("ok    " if ok else "FAIL  ") + message)
+    if not ok:
+        failures.append(message)
+
+
+def burst(label, rows, expect_sent, callers, run):
+    """Run the callers with the stub holding responses until they've all started,
+    then check that each got `rows` rows and that `expect_sent` queries (or any
+    number, if None) reached the triplestore"""
+    global received, result_rows, gate
+    received, result_rows, gate = 0, rows, threading.Event()
+    threading.Timer(START_TIME, gate.set).start()
+    results = run(callers)
+    gate = None
+    if results is None:
+        check(False, f"{label}: hung")
+        return
+    check(
+        all(r is not None and len(r) == rows for r in results),
+        f"{label}: all {len(results)} callers got {rows} rows",
+    )
+    if expect_sent is not None:
+        check(
+            received == expect_sent,
+            f"{label}: {received} queries sent to the triplestore, expected {expect_sent}",
+        )
+
+
+def in_coroutines(db):
+    def run(n):
+        async def all_of_them():
+            queries = [db.run_query("all_mimetypes") for _ in range(n)]
+            return await asyncio.wait_for(asyncio.gather(*queries), TIMEOUT)
+
+        try:
+            return asyncio.run(all_of_them())
+        except asyncio.TimeoutError:
+            return None
+
+    return run
+
+
+def in_threads(run_one):
+    def run(n):
+        results = [None] * n
+
+        def one(i):
+            results[i] = run_one()
+
+        threads = [threading.Thread(target=one, args=(i,)) for i in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(TIMEOUT)
+        return None if any(t.is_alive() for t in threads) else results
+
+    return run
+
+
+def identical(url, n, pool_size):
+    """The coalescing checks; returns whether they all passed"""
+
+    def connection(max_rows=1000):
+        return Connection(
+            query_url=url,
+            query_template_dir="queries",
+            pool_size=pool_size,
+            cache=QueryCache(size=0, ttl=0, max_rows=max_rows),
+        )
+
+    db = connection()
+    burst("coroutines", 3, 1, n, in_coroutines(db))
+    burst("threads", 3, 1, n, in_threads(lambda: db.run_query_sync("all_mimetypes")))
+
+    # The first caller reads one row, waits for the others to join it, and stops;
+    # they must each run the query themselves
+    db = connection()
+    first_started = threading.Event()
+
+    def stops_early():
+        rows = db.iter_query_sync("all_mimetypes")
+        next(rows)
+        first_started.set()
+        time.sleep(START_TIME)
+        rows.close()
+
+    def after_first(run_one):
+        def run():
+            first_started.wait(TIMEOUT)
+            return run_one()
+
+        return run
+
+    def leader_stops_early(n):
+        leader = threading.Thread(target=stops_early)
+        leader.start()
+        results = in_threads(after_first(lambda: db.run_query_sync("all_mimetypes")))(n)
+        leader.join(TIMEOUT)
+        return results
+
+    burst("leader stops early", 10, n + 1, n, leader_stops_early)
+
+    # Results over max_rows aren't shared, so everyone runs the query themselves
+    db = connection(max_rows=5)
+    burst(
+        "over max_rows, threads",
+        10,
+        n,
+        n,
+        in_threads(lambda: db.run_query_sync("all_mimetypes")),
+    )
+    burst("over max_rows, coroutines", 10, None, n, in_coroutines(db))
+    return not failures
+
+
+def timed(label, coro, n):
+    start = time.perf_counter()
+    asyncio.run(coro)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed:7.3f}s  {n / elapsed:8.1f} queries/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--delay", type=float, default=0.02)
+    parser.add_argument("--pool-size", type=int, default=10)
+    parser.add_argument("--port", type=int, default=3999)
+    parser.add_argument("--identical", action="store_true")
+    args = parser.parse_args()
+
+    server = stub_triplestore(args.port, args.delay)
+    url = f"http://127.0.0.1:{args.port}/ds/sparql"
+    if args.identical:
+        passed = identical(url, args.requests, args.pool_size)
+        server.shutdown()
+        sys.exit(0 if passed else 1)
+    timed(
+        "blocking SPARQLWrapper", blocking_baseline(url, args.requests), args.requests
+    )
+    timed(
+        f"pooled Connection ({args.pool_size})",
+        pooled(url, args.requests, args.pool_size),
+        args.requests,
+    )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Check how many SPARQL queries an asset detail request costs, for a data service
+that serves many datasets and links to something outside the catalogue.
+
+Needs a running triplestore (e.g. `docker compose up fuseki`). The script adds a
+data service serving --datasets synthetic datasets to the assets graph, fetches its
+detail with the query cache turned off, checks the query count and that the
+external link comes back as a plain URI, then deletes the assets it added.
+
+Run from the api directory:
+    cd api && TRIPLESTORE_URL=http://localhost:3030 DATASET_NAME=ds \\
+        PYTHONPATH=. python ../dev/check_detail_queries.py --datasets 30
+"""
+import argparse
+import asyncio
+
+from app import metrics
+from app.db import asset
+from app.db.cache import QueryCache
+
+CHECK_ASSET = "http://marketplace.cddo.gov.uk/asset/check-"
+SERVICE_ID = "00000000-0000-4000-8000-000000000000"
+EXTERNAL = "https://example.com/not-in-the-catalogue"
+
+# The data service's details, then one lookup for every asset it links to
+EXPECTED_QUERIES = 2
+
+PREFIXES = """
+PREFIX dcat: <http://www.w3.org/ns/dcat#>
+PREFIX dct: <http://purl.org/dc/terms/>
+PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+PREFIX vcard: <http://www.w3.org/2006/vcard/ns#>
+PREFIX adms: <https://www.w3.org/ns/adms#>
+PREFIX cddo_asset: <http://marketplace.cddo.gov.uk/asset/>
+PREFIX cddo_graph: <http://marketplace.cddo.gov.uk/graph/>
+PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
+PREFIX ukmx: <https://w3id.org/co-cddo/uk-cross-government-metadata-exchange-model/>
+"""
+
+
+def asset_triples(s, identifier, title):
+    return [
+        f'{s} dct:identifier "{identifier}" ;',
+        f'  dct:title "{title}" ;',
+        '  dct:description "Synthetic asset for checking query counts" ;',
+        "  dct:license <https://www.nationalarchives.gov.uk/doc/open-government-licence/version/3/> ;",
+        '  dct:publisher "cabinet-office" ;',
+        '  dct:creator "cabinet-office" ;',
+        '  dct:accessRights "OPEN" ;',
+        '  rdfs:comment "Check asset" ;',
+        '  ukmx:securityClassification "OFFICIAL" ;',
+        '  dcat:version "1" ;',
+        '  dct:modified "2023-01-01"^^xsd:date ;',
+        '  cddo_asset:created "2023-01-01"^^xsd:date ;',
+        '  cddo_asset:modified "2023-01-01"^^xsd:date ;',
+        f"  dcat:contactPoint {s}-contact .",
+        f'{s}-contact vcard:fn "Check" ; vcard:hasEmail "check@example.com" .',
+    ]
+
+
+def seed(db, n_datasets):
+    service = f"<{CHECK_ASSET}service>"
+    triples = asset_triples(service, SERVICE_ID, "Check data service")
+    triples += [
+        f"{service} a dcat:DataService ;",
+        '  dct:type "REST" ; adms:status "LIVE" ;',
+        "  dcat:endpointDescription <https://example.com/docs> ;",
+        f"  dct:relation <{EXTERNAL}> .",
+    ]
+    for i in range(n_datasets):
+        s = f"<{CHECK_ASSET}{i}>"
+        triples += asset_triples(s, f"check-{i}", f"Check dataset {i}")
+        triples += [f"{s} a dcat:Dataset .", f"{service} dcat:servesDataset {s} ."]
+    update = PREFIXES + (
+        "INSERT DATA { GRAPH cddo_graph:assets {\n" + "\n".join(triples) + "\n} }"
+    )
+    db.session.post(db.update_url, data={"update": update}).raise_for_status()
+
+
+def clean_up(db):
+    update = PREFIXES + (
+        "DELETE { GRAPH cddo_graph:assets { ?s ?p ?o } }\n"
+        "WHERE { GRAPH cddo_graph:assets { ?s ?p ?o "
+        f'FILTER STRSTARTS(STR(?s), "{CHECK_ASSET}") }} }}'
+    )
+    db.session.post(db.update_url, data={"update": update}).raise_for_status()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--datasets", type=int, default=30)
+    args = parser.parse_args()
+
+    db = asset.assets_db
+    db.cache = QueryCache(size=0, ttl=0, max_rows=1000)
+    seed(db, args.datasets)
+    try:
+        before = metrics.sparql_duration.count(kind="query")
+        detail = asyncio.run(asset.detail(SERVICE_ID))
+        queries = metrics.sparql_duration.count(kind="query") - before
+
+        served = [d for d in detail["servesDataset"] if isinstance(d, dict)]
+        assert len(served) == args.datasets, detail["servesDataset"]
+        assert detail["relatedAssets"] == [EXTERNAL], detail["relatedAssets"]
+        print(f"{args.datasets} linked datasets: {queries} queries")
+        assert queries == EXPECTED_QUERIES, f"expected {EXPECTED_QUERIES} queries"
+    finally:
+        clean_up(db)
+
+
+if __name__ == "__main__":
+    main()